@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name = 'post management'
+
+    def ready(self):
+        import posts.checks
+        from posts import graph
+        # flush and migrate may have emptied or rewritten Follow.
+        post_migrate.connect(lambda **kwargs: graph.graph.drop(), sender=self, weak=False)
@@ -0,0 +1,183 @@
+"""Async feed and profile endpoints for ASGI, running their independent queries concurrently in a thread pool."""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import prefetch_related_objects
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Post, Follow, Save
+from .loaders import PostBatch, register_post_batch
+from .pagination import KeysetPagination
+from .serializers import PostSerializer, PostPreviewSerializer, UserProfileSerializer
+from users.serializers import UserSerializer
+from users.authentication import TokenUserAuthentication
+from instagram.performance import timed_queries
+from instagram.renderers import ORJSONRenderer
+from . import feed
+
+User = get_user_model()
+
+# PostBatch attributes and the PostSerializer fields that read them.
+BATCH_FIELDS = (('comments', 'comments'), ('liked', 'isLiked'), ('saved', 'isSaved'))
+
+executor = ThreadPoolExecutor(max_workers=getattr(settings, 'ASYNC_DB_WORKERS', 8), thread_name_prefix='async-db')
+
+
+def _drop_broken_connections():
+    # Like close_old_connections(), but ignores CONN_MAX_AGE: each worker
+    # thread keeps its connection for the next task instead of reconnecting.
+    for conn in connections.all():
+        if conn.connection is not None and conn.errors_occurred:
+            if conn.is_usable():
+                conn.errors_occurred = False
+            else:
+                conn.close()
+
+
+def _release_pooled_connections():
+    # An idle worker must not hold a slot of the connection pool that requests wait for.
+    for conn in connections.all():
+        if 'POOL' in conn.settings_dict and conn.connection is not None:
+            conn.close()
+
+
+def _call(func, *args):
+    _drop_broken_connections()
+    try:
+        with timed_queries():
+            return func(*args)
+    finally:
+        _release_pooled_connections()
+
+
+async def run(func, *args):
+    """Run a blocking database function in the pool."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, _call, func, *args))
+
+
+def authenticate(request):
+    result = TokenUserAuthentication().authenticate(request)
+    if result is not None:
+        return result[0]
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+async def authenticated(request):
+    try:
+        user = await run(authenticate, request)
+    except AuthenticationFailed as exc:
+        return None, JsonResponse({'detail': str(exc.detail)}, status=exc.status_code)
+    if user is None:
+        return None, JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    return user, None
+
+
+def drf_request(request, user):
+    drf = Request(request)
+    drf.user = user
+    return drf
+
+
+class EmbeddedPagination(KeysetPagination):
+    """
+    The first page of a list embedded in another response. The request's
+    cursor belongs to the outer response, so it is ignored, and `next`
+    continues at the list's own endpoint.
+    """
+
+    def __init__(self, url):
+        self.url = url
+
+    def decode_cursor(self, request):
+        return None
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri(self.url)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+
+def paginated(paginator, data):
+    return paginator.get_paginated_response(data).data
+
+
+def json_response(data):
+    return HttpResponse(ORJSONRenderer().render(data), content_type=ORJSONRenderer.media_type)
+
+
+async def feed_list(request):
+    user, error = await authenticated(request)
+    if error is not None:
+        return error
+    request = drf_request(request, user)
+    context = {'request': request}
+
+    def page():
+        paginator = KeysetPagination()
+        return paginator, paginator.paginate_fetch(functools.partial(feed.get_feed_page, user.id), request)
+    paginator, posts = await run(page)
+    batch = PostBatch(posts, user.id)
+    serializer = PostSerializer(posts, many=True, context=context)
+    fields = serializer.child.fields
+    # Each task fills a different cache on the posts or the batch, so they can run together.
+    tasks = [run(prefetch_related_objects, posts, lookup) for lookup in serializer.child.get_batch_prefetch()]
+    tasks += [run(getattr, batch, name) for name, field in BATCH_FIELDS if field in fields]
+    await asyncio.gather(*tasks)
+    register_post_batch(context, batch, PostSerializer)
+
+    def serialize():
+        return paginated(paginator, serializer.data)
+    return json_response(await run(serialize))
+
+
+async def user_profile(request, pk):
+    user, error = await authenticated(request)
+    if error is not None:
+        return error
+    request = drf_request(request, user)
+    context = {'request': request}
+
+    def header():
+        return UserProfileSerializer(User.objects.get(pk=pk), context=context).data
+
+    def first_page(queryset, action):
+        paginator = EmbeddedPagination(reverse('users-%s' % action, args=[pk]))
+        return paginator, paginator.paginate_queryset(queryset, request)
+
+    def posts(queryset, action, field=None):
+        if field is not None:
+            queryset = queryset.select_related(field)
+        paginator, page = first_page(queryset, action)
+        if field is not None:
+            page = [getattr(row, field) for row in page]
+        return paginated(paginator, PostPreviewSerializer(page, many=True, context={'request': request}).data)
+
+    def users(queryset, action, field):
+        paginator, page = first_page(queryset.select_related(field), action)
+        return paginated(paginator, UserSerializer([getattr(follow, field) for follow in page], many=True).data)
+
+    try:
+        data, user_posts, saved, followers, following = await asyncio.gather(
+            run(header),
+            run(posts, Post.objects.filter(user=pk), 'posts'),
+            run(posts, Save.objects.filter(user=pk), 'saved', 'post'),
+            run(users, Follow.objects.filter(following=pk), 'followers', 'follower'),
+            run(users, Follow.objects.filter(follower=pk), 'following', 'following'),
+        )
+    except User.DoesNotExist:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    data.update(posts=user_posts, savedPosts=saved, followers=followers, following=following)
+    return json_response(data)
@@ -0,0 +1,129 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+# Seconds a cached response may be served. Writes by the viewer, or to the
+# cached object itself, invalidate immediately; this bounds how long other
+# people's activity (e.g. likes on posts in a feed) can be missing.
+TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+SCOPES = ('feed', 'post', 'user')
+
+
+def shared_cache():
+    """Whether other processes see what this one writes to the default cache."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def version_key(name, pk):
+    return 'ver:%s:%s' % (name, pk)
+
+
+def get_versions(names):
+    """
+    Current version stamps for (name, pk) pairs.
+
+    A missing stamp is replaced with a fresh one rather than a default, so an
+    evicted version can never resurrect responses cached under an older one.
+    """
+    keys = [version_key(name, pk) for name, pk in names]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*names):
+    """Bump the version of (name, pk) pairs once the current transaction commits."""
+    keys = [version_key(name, pk) for name, pk in names]
+    transaction.on_commit(lambda: cache.set_many({key: time.time_ns() for key in keys}, None))
+
+
+def invalidate_feeds(user_ids):
+    invalidate(*(('feed', user_id) for user_id in user_ids))
+
+
+def record(scope, outcome):
+    key = 'cachestat:%s:%s' % (scope, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def stats():
+    keys = ['cachestat:%s:%s' % (scope, outcome) for scope in SCOPES for outcome in ('hit', 'miss', 'notmodified')]
+    counts = cache.get_many(keys)
+    result = {}
+    for scope in SCOPES:
+        hits = counts.get('cachestat:%s:hit' % scope, 0)
+        misses = counts.get('cachestat:%s:miss' % scope, 0)
+        not_modified = counts.get('cachestat:%s:notmodified' % scope, 0)
+        total = hits + misses
+        result[scope] = {'hits': hits, 'misses': misses, 'notModified': not_modified, 'hitRate': hits / total if total else None}
+    return result
+
+
+def validators(request, versions):
+    """
+    ETag and Last-Modified of a response built from `versions`.
+
+    Both also change every TIMEOUT seconds, as a cached response may, so a
+    client revalidating a feed still sees other people's activity.
+    """
+    window = int(time.time() // max(TIMEOUT, 1))
+    tag = '%s|%s|%s|%s|%s' % (request.get_full_path(), request.user.id, request.META.get('HTTP_ACCEPT', ''), versions, window)
+    last_modified = max(max(versions) // 10 ** 9, window * max(TIMEOUT, 1))
+    return '"%s"' % hashlib.md5(tag.encode('utf-8')).hexdigest(), last_modified
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Accept',))
+
+
+def cached_response(request, scope, names, handler, *args, **kwargs):
+    """
+    Serve `handler`'s response from the cache, keyed on the viewer, the full
+    path and the versions of `names`. Only successful responses are stored.
+
+    Successful responses carry an ETag and Last-Modified derived from the
+    same versions, and a matching If-None-Match or If-Modified-Since is
+    answered with 304 without reading the cache or calling `handler`.
+    """
+    versions = get_versions(names)
+    etag, last_modified = validators(request, versions)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        record(scope, 'notmodified')
+        set_validators(not_modified, etag, last_modified)
+        return not_modified
+
+    stamp = '%s|%s' % (request.get_full_path(), versions)
+    key = 'resp:%s:%s:%s' % (scope, request.user.id, hashlib.md5(stamp.encode('utf-8')).hexdigest())
+    data = cache.get(key)
+    if data is not None:
+        record(scope, 'hit')
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+        set_validators(response, etag, last_modified)
+        return response
+
+    record(scope, 'miss')
+    response = handler(request, *args, **kwargs)
+    if response.status_code == 200:
+        cache.set(key, response.data, TIMEOUT)
+        set_validators(response, etag, last_modified)
+    response['X-Cache'] = 'MISS'
+    return response
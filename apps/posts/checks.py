@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.checks import Warning, register, Tags
+
+from .caching import shared_cache
+
+
+@register(Tags.caches, deploy=True)
+def check_graph_cache(app_configs, **kwargs):
+    if shared_cache():
+        return []
+    return [Warning(
+        'The default cache is local to each process, so the follow graph of other workers is only refreshed by '
+        'reloading it every FOLLOW_GRAPH_RELOAD_INTERVAL seconds.',
+        hint='Set REDIS_URL, or another shared cache backend, when running more than one worker process.',
+        id='posts.W001',
+    )]
+
+
+@register(Tags.caches, deploy=True)
+def check_replica_pin_cache(app_configs, **kwargs):
+    if not getattr(settings, 'DATABASE_REPLICAS', []) or shared_cache():
+        return []
+    return [Warning(
+        'The default cache is local to each process, so ReplicaRoutingMiddleware only pins a client to the primary '
+        'database on the worker that handled its write, and reads on other workers may miss that write.',
+        hint='Set REDIS_URL, or another shared cache backend, when using DATABASE_REPLICAS with more than one worker process.',
+        id='posts.W002',
+    )]
@@ -0,0 +1,24 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def increment(model, pk, **deltas):
+    """Atomically add `deltas` to counter columns of a single row."""
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def add_counts(model, field, pks, sign=1):
+    """Add `sign` to `field` once per occurrence of each pk in `pks`, with one UPDATE per distinct delta."""
+    by_delta = defaultdict(list)
+    for pk, count in Counter(pks).items():
+        by_delta[sign * count].append(pk)
+    for delta, ids in by_delta.items():
+        model.objects.filter(pk__in=ids).update(**{field: F(field) + delta})
+
+
+def count_of(model, field):
+    """The number of `model` rows whose `field` points at the outer row, for annotate() and update()."""
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(n=Count('id')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
@@ -0,0 +1,93 @@
+"""Set-based likes, saves and follows for the bulk endpoints, in a fixed number of statements per list."""
+from django.contrib.auth import get_user_model
+
+from .models import Post, Like, Save, Follow
+from . import caching, graph, outbox
+
+User = get_user_model()
+
+CREATED = 'created'
+EXISTS = 'exists'
+DELETED = 'deleted'
+ABSENT = 'absent'
+NOT_FOUND = 'not_found'
+
+
+def _add(model, owner_field, owner_id, target_field, target_model, target_ids):
+    target_ids = list(dict.fromkeys(target_ids))
+    found = set(target_model.objects.filter(id__in=target_ids).values_list('id', flat=True))
+    inserted = {target_id for target_id, in model.objects.insert_new(
+        [model(**{'%s_id' % owner_field: owner_id, '%s_id' % target_field: target_id}) for target_id in target_ids if target_id in found],
+        (target_field,),
+    )}
+    new = [target_id for target_id in target_ids if target_id in inserted]
+    results = {}
+    for target_id in target_ids:
+        if target_id not in found:
+            results[target_id] = NOT_FOUND
+        elif target_id in inserted:
+            results[target_id] = CREATED
+        else:
+            results[target_id] = EXISTS
+    return new, results
+
+
+def _remove(model, owner_field, owner_id, target_field, target_ids):
+    target_ids = list(dict.fromkeys(target_ids))
+    rows = model.objects.filter(**{owner_field: owner_id, '%s__in' % target_field: target_ids})
+    # Locked, so a concurrent removal of the same rows waits and then finds them gone.
+    locked = dict(rows.select_for_update().values_list('id', '%s_id' % target_field))
+    model.objects.filter(id__in=locked).delete()
+    removed_set = set(locked.values())
+    removed = [target_id for target_id in target_ids if target_id in removed_set]
+    return removed, {target_id: DELETED if target_id in removed_set else ABSENT for target_id in target_ids}
+
+
+def like_posts(user_id, post_ids):
+    new, results = _add(Like, 'user', user_id, 'post', Post, post_ids)
+    if new:
+        outbox.publish('like.created', pairs=[[user_id, post_id] for post_id in new])
+    caching.invalidate(*(('post', post_id) for post_id in new), ('feed', user_id))
+    return results
+
+
+def unlike_posts(user_id, post_ids):
+    removed, results = _remove(Like, 'user', user_id, 'post', post_ids)
+    if removed:
+        outbox.publish('like.deleted', pairs=[[user_id, post_id] for post_id in removed])
+    caching.invalidate(*(('post', post_id) for post_id in removed), ('feed', user_id))
+    return results
+
+
+def save_posts(user_id, post_ids):
+    new, results = _add(Save, 'user', user_id, 'post', Post, post_ids)
+    if new:
+        outbox.publish('save.created', pairs=[[user_id, post_id] for post_id in new])
+    caching.invalidate(*(('post', post_id) for post_id in new), ('feed', user_id))
+    return results
+
+
+def unsave_posts(user_id, post_ids):
+    removed, results = _remove(Save, 'user', user_id, 'post', post_ids)
+    if removed:
+        outbox.publish('save.deleted', pairs=[[user_id, post_id] for post_id in removed])
+    caching.invalidate(*(('post', post_id) for post_id in removed), ('feed', user_id))
+    return results
+
+
+def follow_users(user_id, following_ids):
+    new, results = _add(Follow, 'follower', user_id, 'following', User, following_ids)
+    if new:
+        graph.followed(user_id, new)
+        outbox.publish('follow.created', pairs=[[user_id, following_id] for following_id in new])
+        caching.invalidate(('user', user_id), *(('user', following_id) for following_id in new), ('feed', user_id))
+    return results
+
+
+def unfollow_users(user_id, following_ids):
+    removed, results = _remove(Follow, 'follower', user_id, 'following', following_ids)
+    if removed:
+        graph.unfollowed(user_id, removed)
+        outbox.publish('follow.deleted', pairs=[[user_id, following_id] for following_id in removed])
+        caching.invalidate(('user', user_id), *(('user', following_id) for following_id in removed), ('feed', user_id))
+    return results
@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.db.models import Count
+
+from .models import Post, Follow, FeedItem
+from .graph import get_graph
+from .pagination import position_filter
+
+# Authors with more followers than this are not fanned out on write; their
+# posts are pulled into followers' feeds at read time instead.
+FANOUT_LIMIT = getattr(settings, 'FEED_FANOUT_LIMIT', 5000)
+# Number of an author's recent posts copied into a feed on follow.
+BACKFILL_SIZE = getattr(settings, 'FEED_BACKFILL_SIZE', 50)
+# Feed items kept per user by trim_feeds; older posts drop out of the feed.
+MAX_ITEMS = getattr(settings, 'FEED_MAX_ITEMS', 1000)
+BATCH_SIZE = 1000
+# Keyset order of feed pages, on FeedItem and on Post.
+ITEM_ORDERING = ('-createdAt', '-post_id')
+POST_ORDERING = ('-createdAt', '-id')
+
+
+def is_pull_author(user_id):
+    return get_graph().followers_count(user_id) > FANOUT_LIMIT
+
+
+def pull_authors(user_id):
+    """Ids of the accounts `user_id` follows whose posts are read on pull."""
+    graph = get_graph()
+    return [author_id for author_id in graph.following(user_id) if graph.followers_count(author_id) > FANOUT_LIMIT]
+
+
+def _insert(items):
+    FeedItem.objects.bulk_create(items, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Push a new post into the author's feed and, unless the author is a pull author, every follower's feed. Returns the feed owners."""
+    owners = [post.user_id]
+    if not is_pull_author(post.user_id):
+        owners.extend(Follow.objects.filter(following=post.user_id).values_list('follower_id', flat=True))
+    _insert([FeedItem(owner_id=owner_id, post_id=post.id, author_id=post.user_id, createdAt=post.createdAt) for owner_id in owners])
+    return owners
+
+
+def backfill_follow(follower_id, following_id):
+    """Copy the recent posts of a newly followed account into the follower's feed."""
+    if is_pull_author(following_id):
+        return
+    posts = Post.objects.filter(user=following_id).order_by('-createdAt').values_list('id', 'createdAt')[:BACKFILL_SIZE]
+    _insert([FeedItem(owner_id=follower_id, post_id=post_id, author_id=following_id, createdAt=createdAt) for post_id, createdAt in posts])
+    trim_feed(follower_id)
+
+
+def remove_follow(follower_id, following_id):
+    remove_follows(follower_id, [following_id])
+
+
+def remove_follows(follower_id, following_ids):
+    FeedItem.objects.filter(owner=follower_id, author__in=following_ids).delete()
+
+
+def rebuild_feed(user_id):
+    """Recreate a user's materialized feed from their follows and their own posts."""
+    FeedItem.objects.filter(owner=user_id).delete()
+    pulled = set(pull_authors(user_id))
+    authors = [user_id] + [a for a in Follow.objects.filter(follower=user_id).values_list('following_id', flat=True) if a not in pulled]
+    items = []
+    for author_id in authors:
+        posts = Post.objects.filter(user=author_id).order_by('-createdAt').values_list('id', 'createdAt')[:BACKFILL_SIZE]
+        items.extend(FeedItem(owner_id=user_id, post_id=post_id, author_id=author_id, createdAt=createdAt) for post_id, createdAt in posts)
+    _insert(items)
+
+
+def get_feed_page(user_id, position, limit):
+    """
+    Up to `limit` posts of a user's home feed after the keyset `position`
+    (createdAt, id), newest first.
+
+    The page is picked with range scans that return rows in index order: the
+    owner's feed items on (owner, createdAt, post) and, for pull authors,
+    their posts on (user, createdAt). Only the chosen posts are then loaded.
+    """
+    items = FeedItem.objects.filter(owner=user_id)
+    if position is not None:
+        items = items.filter(position_filter(ITEM_ORDERING, position))
+    entries = list(items.order_by(*ITEM_ORDERING).values_list('createdAt', 'post_id')[:limit])
+
+    pulled = pull_authors(user_id)
+    if pulled:
+        posts = Post.objects.filter(user__in=pulled)
+        if position is not None:
+            posts = posts.filter(position_filter(POST_ORDERING, position))
+        entries.extend(posts.order_by(*POST_ORDERING).values_list('createdAt', 'id')[:limit])
+        entries = sorted(set(entries), reverse=True)[:limit]
+
+    posts = Post.objects.in_bulk([post_id for created, post_id in entries])
+    return [posts[post_id] for created, post_id in entries if post_id in posts]
+
+
+def trim_feed(user_id, size=MAX_ITEMS):
+    """Delete a user's feed items beyond the newest `size`."""
+    items = FeedItem.objects.filter(owner=user_id)
+    last = items.order_by(*ITEM_ORDERING).values_list('createdAt', 'post_id')[size - 1:size].first()
+    if last is None:
+        return 0
+    return items.filter(position_filter(ITEM_ORDERING, last)).delete()[0]
+
+
+def trim_feeds(size=MAX_ITEMS):
+    """Trim every feed holding more than `size` items; returns how many items were deleted."""
+    owners = FeedItem.objects.values('owner').annotate(count=Count('id')).filter(count__gt=size).values_list('owner', flat=True)
+    return sum(trim_feed(owner_id, size) for owner_id in owners)
@@ -0,0 +1,236 @@
+"""Process-local copy of the follow graph, kept current through an event log in the shared cache."""
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from .caching import shared_cache
+from .models import Follow
+
+SYNC_INTERVAL = getattr(settings, 'FOLLOW_GRAPH_SYNC_INTERVAL', 1)
+# Without a shared cache there is no event log, so the graph is reloaded this often instead.
+RELOAD_INTERVAL = getattr(settings, 'FOLLOW_GRAPH_RELOAD_INTERVAL', 30)
+# Seconds a missing event is retried before the graph is reloaded instead.
+GAP_TIMEOUT = getattr(settings, 'FOLLOW_GRAPH_GAP_TIMEOUT', 10)
+# A log further ahead than this is not replayed; the graph is reloaded instead.
+MAX_EVENTS = 10000
+EVENT_TIMEOUT = 3600
+FOLLOW = 'f'
+UNFOLLOW = 'u'
+
+_EMPTY = array('i')
+
+logger = logging.getLogger('posts.graph')
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def _insert(adjacency, key, value):
+    ids = adjacency.get(key)
+    if ids is None:
+        adjacency[key] = array('i', [value])
+        return
+    index = bisect_left(ids, value)
+    if index == len(ids) or ids[index] != value:
+        ids.insert(index, value)
+
+
+def _delete(adjacency, key, value):
+    ids = adjacency.get(key)
+    if ids is None:
+        return
+    index = bisect_left(ids, value)
+    if index < len(ids) and ids[index] == value:
+        del ids[index]
+        if not ids:
+            del adjacency[key]
+
+
+class FollowGraph:
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.load_lock = threading.Lock()
+        self.following_of = {}
+        self.followers_of = {}
+        self.seq = None
+        self.synced = 0.0
+        self.loaded = 0.0
+        self.gap_since = None
+        self.reloader = None
+
+    def load(self):
+        """Read the whole graph from Follow; one thread at a time."""
+        with self.load_lock:
+            self._load()
+
+    def _load(self):
+        seq = _current_seq()
+        following_of, followers_of = {}, {}
+        # Ordered by follower, so every followers array is also built in order.
+        rows = Follow.objects.order_by('follower_id', 'following_id').values_list('follower_id', 'following_id')
+        for follower_id, following_id in rows.iterator():
+            following_of.setdefault(follower_id, array('i')).append(following_id)
+            followers_of.setdefault(following_id, array('i')).append(follower_id)
+        with self.lock:
+            self.following_of, self.followers_of = following_of, followers_of
+            self.seq = seq
+            self.synced = self.loaded = time.monotonic()
+            self.gap_since = None
+
+    def reload(self):
+        """Load in a background thread unless one is running; the current graph serves until it is done."""
+        with self.lock:
+            if self.reloader is not None and self.reloader.is_alive():
+                return
+            self.reloader = threading.Thread(target=self._background_load, name='follow-graph-reload', daemon=True)
+            self.reloader.start()
+
+    def _background_load(self):
+        try:
+            self.load()
+        except Exception:
+            logger.exception('follow graph reload failed')
+        finally:
+            connections.close_all()
+
+    def drop(self):
+        """Forget the graph, e.g. after the tables were flushed; the next use loads it again."""
+        with self.lock:
+            self.following_of, self.followers_of = {}, {}
+            self.seq = None
+
+    def sync(self):
+        """Load on first use, then apply other processes' events if the last check is older than SYNC_INTERVAL."""
+        if self.seq is None:
+            # Only the first use waits for a load, and concurrent first uses share it.
+            with self.load_lock:
+                if self.seq is None:
+                    self._load()
+            return
+        now = time.monotonic()
+        if not SHARED_CACHE:
+            if now - self.loaded >= RELOAD_INTERVAL:
+                self.reload()
+            return
+        if now - self.synced < SYNC_INTERVAL:
+            return
+        with self.lock:
+            self.synced = now
+            seq = _current_seq()
+            if self.seq is None or seq == self.seq:
+                return
+            if seq < self.seq or seq - self.seq > MAX_EVENTS:
+                # The counter was reset, or the log is too far ahead to replay.
+                self.reload()
+                return
+            numbers = range(self.seq + 1, seq + 1)
+            events = cache.get_many([_event_key(n) for n in numbers])
+            for n in numbers:
+                event = events.get(_event_key(n))
+                if event is None or event[0] != n:
+                    break
+                self.apply(*event[1:])
+                self.seq = n
+            else:
+                self.gap_since = None
+                return
+            # Retried on the next sync; only an event missing for GAP_TIMEOUT (expired or evicted) forces a reload.
+            if self.gap_since is None:
+                self.gap_since = now
+            elif now - self.gap_since >= GAP_TIMEOUT:
+                self.reload()
+
+    def apply(self, op, follower_id, following_id):
+        with self.lock:
+            if op == FOLLOW:
+                _insert(self.following_of, follower_id, following_id)
+                _insert(self.followers_of, following_id, follower_id)
+            else:
+                _delete(self.following_of, follower_id, following_id)
+                _delete(self.followers_of, following_id, follower_id)
+
+    def following(self, user_id):
+        return self.following_of.get(user_id, _EMPTY)
+
+    def followers(self, user_id):
+        return self.followers_of.get(user_id, _EMPTY)
+
+    def following_count(self, user_id):
+        return len(self.following(user_id))
+
+    def followers_count(self, user_id):
+        return len(self.followers(user_id))
+
+    def is_following(self, follower_id, following_id):
+        return _contains(self.following(follower_id), following_id)
+
+    def is_mutual(self, a, b):
+        return self.is_following(a, b) and self.is_following(b, a)
+
+    def followed_among(self, follower_id, user_ids):
+        """The subset of `user_ids` that `follower_id` follows."""
+        ids = self.following(follower_id)
+        return {user_id for user_id in user_ids if _contains(ids, user_id)}
+
+    def common_following(self, a, b):
+        """Accounts both `a` and `b` follow, probing the larger list with the smaller."""
+        small, large = sorted((self.following(a), self.following(b)), key=len)
+        return [user_id for user_id in small if _contains(large, user_id)]
+
+    def mutuals(self, user_id):
+        """Accounts that `user_id` follows and that follow them back."""
+        followers = self.followers(user_id)
+        return [other_id for other_id in self.following(user_id) if _contains(followers, other_id)]
+
+
+def _event_key(seq):
+    return 'graph:event:%d' % seq
+
+
+def _current_seq():
+    """Number of the last event in the log, starting a new log if the counter is missing."""
+    # A new counter starts past any number an evicted one reached, so old events are never read as new ones.
+    cache.add('graph:seq', time.time_ns() // 1000, None)
+    return cache.get('graph:seq', 0)
+
+
+def _publish(op, follower_id, following_ids):
+    for following_id in following_ids:
+        graph.apply(op, follower_id, following_id)
+    if not SHARED_CACHE:
+        return
+    for following_id in following_ids:
+        # Write the event into the first free slot after the sequence, then expose it, so
+        # readers never see a number whose event is not written yet.
+        n = _current_seq() + 1
+        while not cache.add(_event_key(n), (n, op, follower_id, following_id), EVENT_TIMEOUT):
+            n += 1
+        cache.incr('graph:seq')
+
+
+def followed(follower_id, following_ids):
+    """Record new follows once the current transaction commits."""
+    transaction.on_commit(lambda: _publish(FOLLOW, follower_id, following_ids))
+
+
+def unfollowed(follower_id, following_ids):
+    transaction.on_commit(lambda: _publish(UNFOLLOW, follower_id, following_ids))
+
+
+SHARED_CACHE = shared_cache()
+
+graph = FollowGraph()
+
+
+def get_graph():
+    graph.sync()
+    return graph
@@ -0,0 +1,109 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import prefetch_related_objects
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+
+from .models import Like, Save, Comment, EngagementIntent
+from . import writebehind
+
+# Number of latest comments embedded in each serialized post.
+COMMENT_PREVIEW_SIZE = getattr(settings, 'COMMENT_PREVIEW_SIZE', 3)
+
+
+def latest_comment_ids(post_ids, size):
+    """SQL for the ids of the `size` latest comments of each post, numbered per post with a window function."""
+    qn = connection.ops.quote_name
+    sql = (
+        'SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY post_id ORDER BY %(created)s DESC, id DESC) AS position '
+        'FROM %(table)s WHERE post_id IN (%(posts)s)) latest WHERE position <= %%s'
+    ) % {'created': qn('createdAt'), 'table': qn(Comment._meta.db_table), 'posts': ', '.join(['%s'] * len(post_ids))}
+    return RawSQL(sql, list(post_ids) + [size])
+
+
+class PostBatch:
+    """
+    Data needed to serialize a list of posts, loaded for the whole list at once.
+
+    Related rows are prefetched onto the posts in one query per relation, and
+    the viewer's likes and saves are fetched as id sets on first use, so a page
+    costs a constant number of queries however many posts it holds.
+    """
+
+    def __init__(self, posts, viewer_id, prefetch=()):
+        self.post_ids = {post.id for post in posts}
+        self.viewer_id = viewer_id
+        if prefetch:
+            prefetch_related_objects(posts, *prefetch)
+
+    @cached_property
+    def stored_liked(self):
+        return set(Like.objects.filter(user=self.viewer_id, post__in=self.post_ids).values_list('post_id', flat=True))
+
+    @cached_property
+    def stored_saved(self):
+        return set(Save.objects.filter(user=self.viewer_id, post__in=self.post_ids).values_list('post_id', flat=True))
+
+    @cached_property
+    def pending(self):
+        """The viewer's write-behind intents not flushed yet (see posts.writebehind)."""
+        if not writebehind.ENABLED or self.viewer_id is None or not self.post_ids:
+            return {}
+        return writebehind.pending(self.viewer_id, self.post_ids)
+
+    @cached_property
+    def liked(self):
+        return writebehind.merge(self.stored_liked, self.pending, EngagementIntent.LIKE) if self.pending else self.stored_liked
+
+    @cached_property
+    def saved(self):
+        return writebehind.merge(self.stored_saved, self.pending, EngagementIntent.SAVE) if self.pending else self.stored_saved
+
+    def counter_deltas(self, post_id):
+        """Adjustments to likesCount and savesCount of `post_id` for the viewer's pending intents."""
+        if not self.pending:
+            return {}
+        return {
+            'likesCount': (post_id in self.liked) - (post_id in self.stored_liked),
+            'savesCount': (post_id in self.saved) - (post_id in self.stored_saved),
+        }
+
+    @cached_property
+    def comments(self):
+        """The latest COMMENT_PREVIEW_SIZE comments of each post, newest first, keyed by post id."""
+        comments = defaultdict(list)
+        if not self.post_ids:
+            return comments
+        latest = Comment.objects.filter(id__in=latest_comment_ids(self.post_ids, COMMENT_PREVIEW_SIZE))
+        for comment in latest.select_related('user').order_by('-createdAt', '-id'):
+            comments[comment.post_id].append(comment)
+        return comments
+
+    def __contains__(self, post):
+        return post.id in self.post_ids
+
+
+def load_post_batch(context, posts, prefetch, key):
+    """Load and register a batch for `posts`, unless one covering them was registered already."""
+    batch = context.get('post_batches', {}).get(key)
+    if batch is not None and all(post in batch for post in posts):
+        return batch
+    request = context.get('request')
+    viewer_id = request.user.id if request is not None else None
+    batch = PostBatch(posts, viewer_id, prefetch)
+    register_post_batch(context, batch, key)
+    return batch
+
+
+def register_post_batch(context, batch, key):
+    context.setdefault('post_batches', {})[key] = batch
+
+
+def get_post_batch(context, post, prefetch, key):
+    """The batch `post` was loaded in, or a single-post batch when serialized on its own."""
+    batch = context.get('post_batches', {}).get(key)
+    if batch is None or post not in batch:
+        batch = load_post_batch(context, [post], prefetch, key)
+    return batch
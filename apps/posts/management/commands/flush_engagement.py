@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import writebehind
+
+
+class Command(BaseCommand):
+    help = 'Apply queued write-behind likes and saves (ENGAGEMENT_WRITE_BEHIND); run a single worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=writebehind.BATCH_SIZE, help='intents applied per transaction')
+        parser.add_argument('--loop', action='store_true', help='keep flushing instead of exiting once the queue is empty')
+        parser.add_argument('--interval', type=float, default=1.0, help='seconds to wait when the queue is empty in --loop mode')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            count = writebehind.flush(options['batch_size'])
+            total += count
+            if count:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('applied %d queued intents' % total))
@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import outbox
+
+
+def drain(batch_size, loop, interval):
+    """Handle due outbox events until none are left, or forever with `loop`; returns how many were claimed."""
+    total = 0
+    while True:
+        count = outbox.process(batch_size)
+        total += count
+        if count:
+            continue
+        if not loop:
+            return total
+        time.sleep(interval)
+
+
+class Command(BaseCommand):
+    help = 'Handle the side effects of writes recorded in the outbox (OUTBOX_ENABLED)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='worker processes; they claim disjoint events')
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE, help='events claimed per transaction')
+        parser.add_argument('--loop', action='store_true', help='keep polling instead of exiting once the outbox is empty')
+        parser.add_argument('--interval', type=float, default=1.0, help='seconds to wait when the outbox is empty in --loop mode')
+
+    def handle(self, *args, **options):
+        drain_args = (options['batch_size'], options['loop'], options['interval'])
+        if options['workers'] == 1:
+            total = drain(*drain_args)
+        else:
+            # Forked workers must open their own connections.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+                total = sum(future.result() for future in [pool.submit(drain, *drain_args) for _ in range(options['workers'])])
+        self.stdout.write(self.style.SUCCESS('handled %d outbox events' % total))
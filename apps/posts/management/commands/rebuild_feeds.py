@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from posts import feed
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized home feeds from the follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='only rebuild the feed of this user id')
+
+    def handle(self, *args, **options):
+        user_ids = options['users'] or User.objects.values_list('id', flat=True).iterator()
+        count = 0
+        for user_id in user_ids:
+            with transaction.atomic():
+                feed.rebuild_feed(user_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS('rebuilt %d feeds' % count))
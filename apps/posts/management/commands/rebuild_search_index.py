@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of all posts'
+
+    def handle(self, *args, **options):
+        count = search.reindex_posts(Post.objects.all())
+        self.stdout.write(self.style.SUCCESS('indexed %d posts' % count))
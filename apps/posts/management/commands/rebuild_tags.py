@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post, Tag, PostTag, TagActivity
+from posts import tags
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hashtag index from post tags and captions, and drop expired trending buckets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune-only', action='store_true', help='only delete trending buckets outside the window')
+
+    def handle(self, *args, **options):
+        if not options['prune_only']:
+            with transaction.atomic():
+                TagActivity.objects.all().delete()
+                PostTag.objects.all().delete()
+                Tag.objects.update(postCount=0)
+                for post in Post.objects.order_by('id').iterator():
+                    tags.tag_post(post)
+            self.stdout.write(self.style.SUCCESS('tagged %d posts' % Post.objects.count()))
+        self.stdout.write('pruned %d trending buckets' % tags.prune_activity())
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+
+from posts.models import Post, Comment, Like, Follow, Save
+from posts.counters import count_of
+
+User = get_user_model()
+
+
+# (model, counter column, source table, foreign key on the source table)
+COUNTERS = (
+    (Post, 'likesCount', Like, 'post'),
+    (Post, 'commentsCount', Comment, 'post'),
+    (Post, 'savesCount', Save, 'post'),
+    (User, 'postCount', Post, 'user'),
+    (User, 'followersCount', Follow, 'following'),
+    (User, 'followingCount', Follow, 'follower'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized engagement counters that drifted from their source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='report drift without fixing it')
+
+    def handle(self, *args, **options):
+        for model, field, source, fk in COUNTERS:
+            with transaction.atomic():
+                actual = count_of(source, fk)
+                drifted = model.objects.annotate(actual=actual).exclude(**{field: F('actual')})
+                count = drifted.count()
+                if count and not options['dry_run']:
+                    model.objects.filter(pk__in=drifted.values('pk')).update(**{field: count_of(source, fk)})
+            self.stdout.write('%s.%s: %d drifted' % (model.__name__, field, count))
@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Recompute suggested accounts for users whose follows changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='refresh every user, not only stale ones')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            user_ids = list(User.objects.values_list('id', flat=True))
+            suggestions.refresh_users(user_ids)
+            count = len(user_ids)
+        else:
+            count = suggestions.refresh_stale()
+        self.stdout.write(self.style.SUCCESS('refreshed suggestions for %d users' % count))
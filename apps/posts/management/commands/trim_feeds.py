@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = 'Delete home feed items beyond the newest FEED_MAX_ITEMS of each user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=feed.MAX_ITEMS, help='items kept per feed')
+
+    def handle(self, *args, **options):
+        count = feed.trim_feeds(options['size'])
+        self.stdout.write(self.style.SUCCESS('deleted %d feed items' % count))
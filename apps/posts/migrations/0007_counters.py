@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_feeditem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='commentsCount',
+            field=models.IntegerField(default=0, verbose_name='commentsCount'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likesCount',
+            field=models.IntegerField(default=0, verbose_name='likesCount'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='savesCount',
+            field=models.IntegerField(default=0, verbose_name='savesCount'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2 on 2026-10-18 18:05
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    for model_name, fields in (('Like', ('post', 'user')), ('Save', ('post', 'user')), ('Follow', ('follower', 'following'))):
+        model = apps.get_model('posts', model_name)
+        duplicates = model.objects.values(*fields).annotate(n=Count('id'), keep_id=Min('id')).filter(n__gt=1)
+        for group in duplicates:
+            keep_id = group.pop('keep_id')
+            group.pop('n')
+            model.objects.filter(**group).exclude(id=keep_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'createdAt'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user', 'createdAt'], name='post_user_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('follower', 'following'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('post', 'user'), name='unique_like'),
+        ),
+        migrations.AddConstraint(
+            model_name='save',
+            constraint=models.UniqueConstraint(fields=('post', 'user'), name='unique_save'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2 on 2026-10-18 18:06
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE INDEX post_search_vector_idx ON posts_post USING gin ("searchVector")')
+    schema_editor.execute(
+        'UPDATE posts_post SET "searchVector" = '
+        "setweight(to_tsvector('simple', COALESCE(caption, '')), 'A') || "
+        "setweight(to_tsvector('simple', COALESCE(tags, '')), 'B')"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS post_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_engagement_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='searchVector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='searchVector'),
+        ),
+        migrations.CreateModel(
+            name='PostTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, verbose_name='term')),
+                ('weight', models.IntegerField(default=1, verbose_name='weight')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='posts.post', verbose_name='post')),
+            ],
+            options={
+                'verbose_name': 'post term',
+                'verbose_name_plural': 'post term',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='postterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_post_term'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
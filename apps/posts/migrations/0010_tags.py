@@ -0,0 +1,70 @@
+# Generated by Django 3.2 on 2026-10-18 18:07
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='name')),
+                ('postCount', models.IntegerField(default=0, verbose_name='postCount')),
+                ('createdAt', models.DateTimeField(default=datetime.datetime.now, verbose_name='createdAt')),
+            ],
+            options={
+                'verbose_name': 'tag',
+                'verbose_name_plural': 'tag',
+            },
+        ),
+        migrations.CreateModel(
+            name='TagActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(verbose_name='bucket')),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='posts.tag', verbose_name='tag')),
+            ],
+            options={
+                'verbose_name': 'tag activity',
+                'verbose_name_plural': 'tag activity',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('createdAt', models.DateTimeField(default=datetime.datetime.now, verbose_name='createdAt')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='posts.post', verbose_name='post')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='posts.tag', verbose_name='tag')),
+            ],
+            options={
+                'verbose_name': 'post tag',
+                'verbose_name_plural': 'post tag',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='tagactivity',
+            index=models.Index(fields=['bucket'], name='tag_activity_bucket_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='tagactivity',
+            constraint=models.UniqueConstraint(fields=('tag', 'bucket'), name='unique_tag_activity'),
+        ),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['tag', '-createdAt'], name='post_tag_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='posttag',
+            constraint=models.UniqueConstraint(fields=('tag', 'post'), name='unique_post_tag'),
+        ),
+    ]
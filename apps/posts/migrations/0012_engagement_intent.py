@@ -0,0 +1,36 @@
+# Generated by Django 3.2 on 2026-10-18 18:32
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_suggestions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EngagementIntent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('like', 'like'), ('save', 'save')], max_length=10, verbose_name='kind')),
+                ('added', models.BooleanField(default=True, verbose_name='added')),
+                ('createdAt', models.DateTimeField(default=datetime.datetime.now, verbose_name='createdAt')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.post', verbose_name='post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'engagement intent',
+                'verbose_name_plural': 'engagement intent',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='engagementintent',
+            index=models.Index(fields=['user', 'post'], name='intent_user_post_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.2 on 2026-10-18 18:35
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_engagement_intent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verb', models.CharField(choices=[('like', 'like'), ('comment', 'comment'), ('follow', 'follow')], max_length=10, verbose_name='verb')),
+                ('createdAt', models.DateTimeField(default=datetime.datetime.now, verbose_name='createdAt')),
+            ],
+            options={
+                'verbose_name': 'notification',
+                'verbose_name_plural': 'notification',
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=50, verbose_name='topic')),
+                ('payload', models.JSONField(default=dict, verbose_name='payload')),
+                ('attempts', models.IntegerField(default=0, verbose_name='attempts')),
+                ('lastError', models.TextField(blank=True, default='', verbose_name='lastError')),
+                ('availableAt', models.DateTimeField(default=datetime.datetime.now, verbose_name='availableAt')),
+                ('createdAt', models.DateTimeField(default=datetime.datetime.now, verbose_name='createdAt')),
+            ],
+            options={
+                'verbose_name': 'outbox event',
+                'verbose_name_plural': 'outbox event',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(fields=['availableAt'], name='outbox_available_idx'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='actor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='actor'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='post',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.post', verbose_name='post'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recipient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL, verbose_name='recipient'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-createdAt', '-id'], name='notification_recipient_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-18 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_outbox_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postfile',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64, verbose_name='sha256'),
+        ),
+        migrations.AddField(
+            model_name='postfile',
+            name='size',
+            field=models.IntegerField(default=0, verbose_name='size'),
+        ),
+    ]
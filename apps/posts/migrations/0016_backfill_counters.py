@@ -0,0 +1,32 @@
+from django.db import migrations
+
+from posts.counters import count_of
+
+# (app, model, counter column, source model, foreign key on the source model)
+COUNTERS = (
+    ('posts', 'Post', 'likesCount', 'Like', 'post'),
+    ('posts', 'Post', 'commentsCount', 'Comment', 'post'),
+    ('posts', 'Post', 'savesCount', 'Save', 'post'),
+    ('users', 'UserProfile', 'postCount', 'Post', 'user'),
+    ('users', 'UserProfile', 'followersCount', 'Follow', 'following'),
+    ('users', 'UserProfile', 'followingCount', 'Follow', 'follower'),
+)
+
+
+def backfill_counters(apps, schema_editor):
+    for app_label, model_name, field, source_name, fk in COUNTERS:
+        model = apps.get_model(app_label, model_name)
+        source = apps.get_model('posts', source_name)
+        model.objects.update(**{field: count_of(source, fk)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_feed_keyset_index'),
+        ('users', '0007_suggestions_stale'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_backfill_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['following', '-createdAt', '-id'], name='follow_following_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['follower', '-createdAt', '-id'], name='follow_follower_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='save',
+            index=models.Index(fields=['user', '-createdAt', '-id'], name='save_user_keyset_idx'),
+        ),
+    ]
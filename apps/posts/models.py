@@ -1,18 +1,61 @@
 from datetime import datetime
 
-from django.db import models
+from django.db import models, transaction, connections, router, IntegrityError
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 
 
 User = get_user_model()
 
 # Create your models here.
 
+class EngagementManager(models.Manager):
+
+    def insert_or_get(self, **kwargs):
+        """Insert a row in one statement, falling back to the existing row on a unique conflict."""
+        try:
+            with transaction.atomic():
+                return self.create(**kwargs), True
+        except IntegrityError:
+            return self.get(**kwargs), False
+
+    def insert_new(self, objs, returning):
+        """
+        Insert `objs` in one statement, skipping those that conflict with an
+        existing row, and return the `returning` fields of the rows actually
+        inserted, as tuples. Unlike bulk_create(ignore_conflicts=True), concurrent
+        inserts of the same rows are never reported as new twice.
+        """
+        if not objs:
+            return []
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+        qn = connection.ops.quote_name
+        fields = [field for field in self.model._meta.concrete_fields if not field.primary_key]
+        params = []
+        for obj in objs:
+            params += [field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields]
+        row = '(%s)' % ', '.join(['%s'] * len(fields))
+        sql = 'INSERT INTO %s (%s) VALUES %s ON CONFLICT DO NOTHING RETURNING %s' % (
+            qn(self.model._meta.db_table),
+            ', '.join(qn(field.column) for field in fields),
+            ', '.join([row] * len(objs)),
+            ', '.join(qn(self.model._meta.get_field(name).column) for name in returning),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [tuple(row) for row in cursor.fetchall()]
+
+
 class Post(models.Model):
     user = models.ForeignKey(User, related_name='posts', on_delete=models.CASCADE)
     caption = models.CharField(max_length=200, default='', verbose_name='caption')
     tags = models.CharField(max_length=100, null=True, blank=True, verbose_name='tags')
     createdAt = models.DateTimeField(default=datetime.now, verbose_name='createdAt')
+    likesCount = models.IntegerField(default=0, verbose_name='likesCount')
+    commentsCount = models.IntegerField(default=0, verbose_name='commentsCount')
+    savesCount = models.IntegerField(default=0, verbose_name='savesCount')
+    searchVector = SearchVectorField(null=True, editable=False, verbose_name='searchVector')
     
     def __str__(self):
         return self.caption
@@ -20,12 +63,17 @@ class Post(models.Model):
     class Meta:
         verbose_name = 'post'
         verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['user', 'createdAt'], name='post_user_created_idx'),
+        ]
 
 
 class PostFile(models.Model):
     url = models.CharField(max_length=200, default='', verbose_name='url')
     post = models.ForeignKey(Post, related_name='files', verbose_name='files', on_delete=models.CASCADE)
     user = models.ForeignKey(User, verbose_name='user', on_delete=models.CASCADE)
+    sha256 = models.CharField(max_length=64, blank=True, default='', db_index=True, verbose_name='sha256')
+    size = models.IntegerField(default=0, verbose_name='size')
     createdAt = models.DateTimeField(default=datetime.now, verbose_name='createdAt')
 
     def __str__(self):
@@ -48,6 +96,9 @@ class Comment(models.Model):
     class Meta:
         verbose_name = 'comment'
         verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['post', 'createdAt'], name='comment_post_created_idx'),
+        ]
 
 
 class Like(models.Model):
@@ -55,12 +106,17 @@ class Like(models.Model):
     user = models.ForeignKey(User, verbose_name='user', on_delete=models.CASCADE)
     createdAt = models.DateTimeField(default=datetime.now, verbose_name='createdAt')
 
+    objects = EngagementManager()
+
     def __str__(self):
         return self.post.caption
 
     class Meta:
         verbose_name = 'like'
         verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'user'], name='unique_like'),
+        ]
 
 
 class Follow(models.Model):
@@ -68,12 +124,21 @@ class Follow(models.Model):
     follower = models.ForeignKey(User, verbose_name='follower', on_delete=models.CASCADE)
     createdAt = models.DateTimeField(default=datetime.now, verbose_name='createdAt')
 
+    objects = EngagementManager()
+
     def __str__(self):
         return self.following.username
 
     class Meta:
         verbose_name = 'follow'
         verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'following'], name='unique_follow'),
+        ]
+        indexes = [
+            models.Index(fields=['following', '-createdAt', '-id'], name='follow_following_keyset_idx'),
+            models.Index(fields=['follower', '-createdAt', '-id'], name='follow_follower_keyset_idx'),
+        ]
 
 
 class Save(models.Model):
@@ -81,9 +146,193 @@ class Save(models.Model):
     user = models.ForeignKey(User, verbose_name='user', on_delete=models.CASCADE)
     createdAt = models.DateTimeField(default=datetime.now, verbose_name='createdAt')
 
+    objects = EngagementManager()
+
     def __str__(self):
         return self.post.caption
 
     class Meta:
         verbose_name = 'save'
-        verbose_name_plural = verbose_name
\ No newline at end of file
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'user'], name='unique_save'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-createdAt', '-id'], name='save_user_keyset_idx'),
+        ]
+
+
+class FeedItem(models.Model):
+    owner = models.ForeignKey(User, related_name='feed_items', verbose_name='owner', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='feed_items', verbose_name='post', on_delete=models.CASCADE)
+    author = models.ForeignKey(User, related_name='+', verbose_name='author', on_delete=models.CASCADE)
+    createdAt = models.DateTimeField(default=datetime.now, verbose_name='createdAt')
+
+    def __str__(self):
+        return self.post.caption
+
+    class Meta:
+        verbose_name = 'feed item'
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='unique_feed_item'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-createdAt', '-post'], name='feed_owner_keyset_idx'),
+            models.Index(fields=['owner', 'author'], name='feed_owner_author_idx'),
+        ]
+
+
+class PostTerm(models.Model):
+    """Inverted index of post words, used for search on databases without full-text search."""
+    term = models.CharField(max_length=100, verbose_name='term')
+    post = models.ForeignKey(Post, related_name='terms', verbose_name='post', on_delete=models.CASCADE)
+    weight = models.IntegerField(default=1, verbose_name='weight')
+
+    def __str__(self):
+        return self.term
+
+    class Meta:
+        verbose_name = 'post term'
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'post'], name='unique_post_term'),
+        ]
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=100, unique=True, verbose_name='name')
+    postCount = models.IntegerField(default=0, verbose_name='postCount')
+    createdAt = models.DateTimeField(default=datetime.now, verbose_name='createdAt')
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'tag'
+        verbose_name_plural = verbose_name
+
+
+class PostTag(models.Model):
+    tag = models.ForeignKey(Tag, related_name='post_tags', verbose_name='tag', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='post_tags', verbose_name='post', on_delete=models.CASCADE)
+    createdAt = models.DateTimeField(default=datetime.now, verbose_name='createdAt')
+
+    def __str__(self):
+        return self.tag.name
+
+    class Meta:
+        verbose_name = 'post tag'
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'post'], name='unique_post_tag'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', '-createdAt'], name='post_tag_created_idx'),
+        ]
+
+
+class TagActivity(models.Model):
+    """Number of posts using a tag within one hour, summed over a window for trending tags."""
+    tag = models.ForeignKey(Tag, related_name='activity', verbose_name='tag', on_delete=models.CASCADE)
+    bucket = models.DateTimeField(verbose_name='bucket')
+    count = models.IntegerField(default=0, verbose_name='count')
+
+    def __str__(self):
+        return self.tag.name
+
+    class Meta:
+        verbose_name = 'tag activity'
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'bucket'], name='unique_tag_activity'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket'], name='tag_activity_bucket_idx'),
+        ]
+
+
+class Suggestion(models.Model):
+    owner = models.ForeignKey(User, related_name='suggestions', verbose_name='owner', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='+', verbose_name='user', on_delete=models.CASCADE)
+    mutualCount = models.IntegerField(default=0, verbose_name='mutualCount')
+    createdAt = models.DateTimeField(default=datetime.now, verbose_name='createdAt')
+
+    def __str__(self):
+        return self.user.username
+
+    class Meta:
+        verbose_name = 'suggestion'
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'user'], name='unique_suggestion'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-mutualCount'], name='suggestion_owner_score_idx'),
+        ]
+
+
+class EngagementIntent(models.Model):
+    """A like, save, unlike or unsave accepted by the API and not yet applied (see posts.writebehind)."""
+    LIKE = 'like'
+    SAVE = 'save'
+    KIND_CHOICES = ((LIKE, 'like'), (SAVE, 'save'))
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name='kind')
+    user = models.ForeignKey(User, related_name='+', verbose_name='user', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='+', verbose_name='post', on_delete=models.CASCADE)
+    added = models.BooleanField(default=True, verbose_name='added')
+    createdAt = models.DateTimeField(default=datetime.now, verbose_name='createdAt')
+
+    def __str__(self):
+        return '%s %s' % (self.kind, self.post_id)
+
+    class Meta:
+        verbose_name = 'engagement intent'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['user', 'post'], name='intent_user_post_idx'),
+        ]
+
+
+class OutboxEvent(models.Model):
+    """A side effect of a write, stored in the write's transaction and handled later by process_outbox (see posts.outbox)."""
+    topic = models.CharField(max_length=50, verbose_name='topic')
+    payload = models.JSONField(default=dict, verbose_name='payload')
+    attempts = models.IntegerField(default=0, verbose_name='attempts')
+    lastError = models.TextField(blank=True, default='', verbose_name='lastError')
+    availableAt = models.DateTimeField(default=datetime.now, verbose_name='availableAt')
+    createdAt = models.DateTimeField(default=datetime.now, verbose_name='createdAt')
+
+    def __str__(self):
+        return self.topic
+
+    class Meta:
+        verbose_name = 'outbox event'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['availableAt'], name='outbox_available_idx'),
+        ]
+
+
+class Notification(models.Model):
+    LIKE = 'like'
+    COMMENT = 'comment'
+    FOLLOW = 'follow'
+    VERB_CHOICES = ((LIKE, 'like'), (COMMENT, 'comment'), (FOLLOW, 'follow'))
+
+    recipient = models.ForeignKey(User, related_name='notifications', verbose_name='recipient', on_delete=models.CASCADE)
+    actor = models.ForeignKey(User, related_name='+', verbose_name='actor', on_delete=models.CASCADE)
+    verb = models.CharField(max_length=10, choices=VERB_CHOICES, verbose_name='verb')
+    post = models.ForeignKey(Post, null=True, blank=True, related_name='+', verbose_name='post', on_delete=models.CASCADE)
+    createdAt = models.DateTimeField(default=datetime.now, verbose_name='createdAt')
+
+    def __str__(self):
+        return '%s %s' % (self.actor_id, self.verb)
+
+    class Meta:
+        verbose_name = 'notification'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['recipient', '-createdAt', '-id'], name='notification_recipient_idx'),
+        ]
@@ -0,0 +1,192 @@
+"""Transactional outbox: side effects of writes are stored with the write and handled by process_outbox."""
+import logging
+import traceback
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .models import Post, Like, Follow, OutboxEvent, Notification
+from .counters import increment, add_counts
+from . import feed, search, tags, caching, suggestions
+
+User = get_user_model()
+
+ENABLED = getattr(settings, 'OUTBOX_ENABLED', False)
+BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 10)
+# Delay before the first retry of a failed event; doubled on each attempt.
+RETRY_SECONDS = getattr(settings, 'OUTBOX_RETRY_SECONDS', 5)
+
+logger = logging.getLogger('posts.outbox')
+
+HANDLERS = {}
+
+
+def handler(topic):
+    def register(func):
+        HANDLERS[topic] = func
+        return func
+    return register
+
+
+def publish(topic, **payload):
+    """Record the side effects of a write; call inside the write's transaction."""
+    if ENABLED:
+        OutboxEvent.objects.create(topic=topic, payload=payload)
+    else:
+        HANDLERS[topic](**payload)
+
+
+def process(batch_size=BATCH_SIZE):
+    """Handle up to `batch_size` due events in one transaction; returns how many were claimed."""
+    now = datetime.now()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(availableAt__lte=now, attempts__lt=MAX_ATTEMPTS)
+            .order_by('id')[:batch_size]
+        )
+        handled = []
+        for event in events:
+            try:
+                with transaction.atomic():
+                    HANDLERS[event.topic](**event.payload)
+            except Exception:
+                logger.exception('outbox event %s (%s) failed', event.id, event.topic)
+                event.attempts += 1
+                event.lastError = traceback.format_exc()[-2000:]
+                event.availableAt = now + timedelta(seconds=RETRY_SECONDS * 2 ** (event.attempts - 1))
+                event.save(update_fields=['attempts', 'lastError', 'availableAt'])
+            else:
+                handled.append(event.id)
+        OutboxEvent.objects.filter(id__in=handled).delete()
+    return len(events)
+
+
+def stats():
+    events = OutboxEvent.objects
+    return {
+        'pending': events.filter(attempts__lt=MAX_ATTEMPTS).count(),
+        'failed': events.filter(attempts__gte=MAX_ATTEMPTS).count(),
+    }
+
+
+def notify(recipient_id, actor_id, verb, post_id=None):
+    if recipient_id is not None and recipient_id != actor_id:
+        Notification.objects.create(recipient_id=recipient_id, actor_id=actor_id, verb=verb, post_id=post_id)
+
+
+def notify_many(notifications):
+    """Create (recipient id, actor id, verb, post id) notifications in one INSERT."""
+    Notification.objects.bulk_create([
+        Notification(recipient_id=recipient_id, actor_id=actor_id, verb=verb, post_id=post_id)
+        for recipient_id, actor_id, verb, post_id in notifications
+        if recipient_id is not None and recipient_id != actor_id
+    ])
+
+
+def post_owner(post_id):
+    return Post.objects.filter(id=post_id).values_list('user_id', flat=True).first()
+
+
+@handler('post.created')
+def post_created(post, user):
+    increment(User, user, postCount=1)
+    caching.invalidate(('user', user))
+    instance = Post.objects.filter(id=post).first()
+    if instance is None:
+        return
+    caching.invalidate_feeds(feed.fan_out_post(instance))
+    search.index_post(instance)
+    tags.tag_post(instance)
+
+
+@handler('post.deleted')
+def post_deleted(post, user):
+    increment(User, user, postCount=-1)
+    caching.invalidate(('user', user))
+
+
+@handler('comment.created')
+def comment_created(comment, post, user):
+    increment(Post, post, commentsCount=1)
+    notify(post_owner(post), user, Notification.COMMENT, post)
+    caching.invalidate(('post', post))
+
+
+@handler('comment.deleted')
+def comment_deleted(comment, post, user):
+    increment(Post, post, commentsCount=-1)
+    caching.invalidate(('post', post))
+
+
+def _linked(model, owner_field, target_field, pairs):
+    """The (owner id, target id) pairs that currently exist as `model` rows."""
+    owners = {owner for owner, target in pairs}
+    targets = {target for owner, target in pairs}
+    rows = model.objects.filter(**{'%s__in' % owner_field: owners, '%s__in' % target_field: targets})
+    return set(rows.values_list('%s_id' % owner_field, '%s_id' % target_field)) & {tuple(pair) for pair in pairs}
+
+
+def _engagement_changed(pairs, counter, sign):
+    add_counts(Post, counter, [post for user, post in pairs], sign)
+    # The actors' own responses were invalidated with the write; this is for everyone else's view of the counts.
+    caching.invalidate(*{('post', post) for user, post in pairs})
+
+
+@handler('like.created')
+def like_created(pairs):
+    """Likes `pairs` of [user id, post id] were created, by any write path."""
+    _engagement_changed(pairs, 'likesCount', 1)
+    owners = dict(Post.objects.filter(id__in={post for user, post in pairs}).values_list('id', 'user_id'))
+    notify_many((owners.get(post), user, Notification.LIKE, post) for user, post in _linked(Like, 'user', 'post', pairs))
+
+
+@handler('like.deleted')
+def like_deleted(pairs):
+    _engagement_changed(pairs, 'likesCount', -1)
+
+
+@handler('save.created')
+def save_created(pairs):
+    _engagement_changed(pairs, 'savesCount', 1)
+
+
+@handler('save.deleted')
+def save_deleted(pairs):
+    _engagement_changed(pairs, 'savesCount', -1)
+
+
+@handler('follow.created')
+def follow_created(pairs):
+    """Follows `pairs` of [follower id, following id] were created."""
+    add_counts(User, 'followingCount', [follower for follower, following in pairs], 1)
+    add_counts(User, 'followersCount', [following for follower, following in pairs], 1)
+    linked = _linked(Follow, 'follower', 'following', pairs)
+    for follower, following in linked:
+        feed.backfill_follow(follower, following)
+    notify_many((following, follower, Notification.FOLLOW, None) for follower, following in linked)
+    _follows_changed(pairs)
+
+
+@handler('follow.deleted')
+def follow_deleted(pairs):
+    add_counts(User, 'followingCount', [follower for follower, following in pairs], -1)
+    add_counts(User, 'followersCount', [following for follower, following in pairs], -1)
+    linked = _linked(Follow, 'follower', 'following', pairs)
+    for follower, following in pairs:
+        if (follower, following) not in linked:
+            feed.remove_follow(follower, following)
+    _follows_changed(pairs)
+
+
+def _follows_changed(pairs):
+    followers = {follower for follower, following in pairs}
+    for follower in followers:
+        suggestions.follows_changed(follower)
+    caching.invalidate(
+        *(('user', user) for user in followers | {following for follower, following in pairs}),
+        *(('feed', follower) for follower in followers),
+    )
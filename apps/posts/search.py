@@ -0,0 +1,91 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast
+
+from .models import Post, PostTerm
+
+SEARCH_CONFIG = getattr(settings, 'SEARCH_CONFIG', 'simple')
+MAX_TERMS = 8
+# Relative weight of a word found in the caption and in the tags.
+CAPTION_WEIGHT = 2
+TAGS_WEIGHT = 1
+# PostgreSQL ranks are ordered and paginated as int(ts_rank * RANK_SCALE).
+RANK_SCALE = 1000000
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def tokenize(text):
+    return [word[:100] for word in WORD_RE.findall((text or '').lower())]
+
+
+def post_vector():
+    return (
+        SearchVector('caption', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('tags', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def post_terms(post):
+    weights = {}
+    for word in tokenize(post.tags):
+        weights[word] = TAGS_WEIGHT
+    for word in tokenize(post.caption):
+        weights[word] = weights.get(word, 0) + CAPTION_WEIGHT
+    return [PostTerm(term=term, post_id=post.id, weight=weight) for term, weight in weights.items()]
+
+
+def index_post(post):
+    """Refresh the search index entry of a post after its caption or tags changed."""
+    if uses_postgres():
+        Post.objects.filter(pk=post.pk).update(searchVector=post_vector())
+    else:
+        PostTerm.objects.filter(post=post.pk).delete()
+        PostTerm.objects.bulk_create(post_terms(post))
+
+
+def reindex_posts(queryset, batch_size=1000):
+    if uses_postgres():
+        return queryset.update(searchVector=post_vector())
+    count = 0
+    for start in range(0, queryset.count(), batch_size):
+        posts = list(queryset.order_by('id')[start:start + batch_size])
+        PostTerm.objects.filter(post__in=posts).delete()
+        PostTerm.objects.bulk_create([term for post in posts for term in post_terms(post)])
+        count += len(posts)
+    return count
+
+
+def search_posts(text):
+    """
+    Posts matching every word of `text` as a prefix, annotated with a relevance `rank`.
+
+    On PostgreSQL this is a GIN-indexed tsquery against `Post.searchVector`;
+    elsewhere each word is an index range scan over `PostTerm`.
+    """
+    terms = tokenize(text)[:MAX_TERMS]
+    if not terms:
+        return Post.objects.none().annotate(rank=Value(0, output_field=IntegerField()))
+    if uses_postgres():
+        query = SearchQuery(' & '.join('%s:*' % term for term in terms), search_type='raw', config=SEARCH_CONFIG)
+        # ts_rank is a float4 that doesn't survive a round trip through a
+        # JSON cursor exactly, so the keyset compares it as a scaled integer.
+        rank = Cast(SearchRank(F('searchVector'), query) * RANK_SCALE, IntegerField())
+        return Post.objects.filter(searchVector=query).annotate(rank=rank)
+
+    queryset = Post.objects.all()
+    matched = Q()
+    for term in terms:
+        prefix = Q(term__gte=term, term__lt=term + '\U0010ffff')
+        queryset = queryset.filter(id__in=PostTerm.objects.filter(prefix).values('post_id'))
+        matched |= prefix
+    weights = PostTerm.objects.filter(matched, post=OuterRef('pk')).order_by().values('post').annotate(total=Sum('weight')).values('total')
+    return queryset.annotate(rank=Subquery(weights, output_field=IntegerField()))
@@ -1,76 +1,95 @@
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
-from django.db.models import Q
+from django.db import models
+from django.conf import settings
 from django.contrib.auth import get_user_model
 
-from .models import Post, PostFile, Comment, Like, Follow, Save
+from .models import Post, PostFile, Comment, Like, Follow, Save, Tag, Suggestion, Notification
+from .loaders import load_post_batch, get_post_batch
+from .graph import get_graph
 from users.serializers import UserSerializer
+from instagram.performance import TimedSerializerMixin, TimedListSerializer
+from instagram.serializers import SparseFieldsMixin
 
 User = get_user_model()
 
+BULK_MAX_ITEMS = getattr(settings, 'BULK_MAX_ITEMS', 500)
+
 
 class FilesSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = PostFile
-        fields = '__all__'
+        exclude = ('sha256', 'size')
 
 
-class PostPreviewSerializer(serializers.ModelSerializer):
-    likesCount = serializers.SerializerMethodField()
-    commentsCount = serializers.SerializerMethodField()
-    files = serializers.SerializerMethodField()
- 
-    def get_commentsCount(self, instance):
-        return Comment.objects.filter(Q(post=instance.id)).count()
+class PostListSerializer(TimedListSerializer):
+
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, models.Manager) else data)
+        load_post_batch(self.context, posts, self.child.get_batch_prefetch(), type(self.child))
+        return super().to_representation(posts)
+
+
+class PostBatchMixin:
+    """Serializes posts from a PostBatch instead of querying per post and field."""
+    batch_prefetch = ()
+
+    def get_batch_prefetch(self):
+        """The relations in batch_prefetch that are selected for output."""
+        return [lookup for lookup in self.batch_prefetch if lookup in self.fields]
 
-    def get_likesCount(self, instance):
-        return Like.objects.filter(Q(post=instance.id)).count()
+    def get_batch(self, instance):
+        return get_post_batch(self.context, instance, self.get_batch_prefetch(), type(self))
 
+    def to_representation(self, instance):
+        batch = self.get_batch(instance)
+        data = super().to_representation(instance)
+        for field, delta in batch.counter_deltas(instance.id).items():
+            if delta and field in data:
+                data[field] += delta
+        return data
+
+
+class PostPreviewSerializer(TimedSerializerMixin, SparseFieldsMixin, PostBatchMixin, serializers.ModelSerializer):
+    files = serializers.SerializerMethodField()
+    batch_prefetch = ('files',)
+ 
     def get_files(self, instance):
-        post_files = PostFile.objects.filter(Q(post=instance.id))
-        files_serializer = FilesSerializer(post_files, many=True, read_only=True)
+        files_serializer = FilesSerializer(instance.files.all(), many=True, read_only=True)
         return files_serializer.data
 
     class Meta:
         model = Post
         fields = ('id', 'likesCount', 'commentsCount', 'files')
+        list_serializer_class = PostListSerializer
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(TimedSerializerMixin, SparseFieldsMixin, PostBatchMixin, serializers.ModelSerializer):
     user = UserSerializer()
     files = serializers.SerializerMethodField()
     isLiked = serializers.SerializerMethodField()
-    likesCount = serializers.SerializerMethodField()
     isSaved = serializers.SerializerMethodField()
-    commentsCount = serializers.SerializerMethodField()
     comments = serializers.SerializerMethodField()
+    batch_prefetch = ('user', 'files')
 
     def get_files(self, instance):
-        post_files = PostFile.objects.filter(Q(post=instance.id))
-        files_serializer = FilesSerializer(post_files, many=True, read_only=True)
+        files_serializer = FilesSerializer(instance.files.all(), many=True, read_only=True)
         return files_serializer.data
 
     def get_isLiked(self, instance):
-        return Like.objects.filter(Q(post=instance.id) & Q(user=self.context["request"].user.id)).exists()
+        return instance.id in self.get_batch(instance).liked
 
     def get_isSaved(self, instance):
-        return Save.objects.filter(Q(post=instance.id) & Q(user=self.context["request"].user.id)).exists()
-
-    def get_commentsCount(self, instance):
-        return Comment.objects.filter(Q(post=instance.id)).count()
+        return instance.id in self.get_batch(instance).saved
 
     def get_comments(self, instance):
-        post_comments = Comment.objects.filter(Q(post=instance.id)).order_by('-createdAt')
-        comments_serializer = CommentsSerializer(post_comments, many=True, read_only=True)
+        comments_serializer = CommentsSerializer(self.get_batch(instance).comments[instance.id], many=True, read_only=True)
         return comments_serializer.data
 
-    def get_likesCount(self, instance):
-        return Like.objects.filter(Q(post=instance.id)).count()
-
     class Meta:
         model = Post
-        fields = '__all__'
+        exclude = ('searchVector',)
+        list_serializer_class = PostListSerializer
 
 
 class FilesCreateSerializer(serializers.ModelSerializer):
@@ -92,9 +111,8 @@ class PostCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         files_data = validated_data.pop('files')
         post = Post.objects.create(**validated_data)
-        if len(files_data) > 0:
-            for file_data in files_data:
-                PostFile.objects.create(post=post, **file_data)
+        if files_data:
+            PostFile.objects.bulk_create([PostFile(post=post, **file_data) for file_data in files_data])
         return post
 
     class Meta:
@@ -102,12 +120,13 @@ class PostCreateSerializer(serializers.ModelSerializer):
         fields = ('caption', 'user', 'files', 'tags')
 
 
-class CommentsSerializer(serializers.ModelSerializer): 
+class CommentsSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer): 
     user = UserSerializer()
 
     class Meta:
         model = Comment
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
 
 
 class CommentCreateSerializer(serializers.ModelSerializer):
@@ -117,7 +136,7 @@ class CommentCreateSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class LikesSerializer(serializers.ModelSerializer):
+class LikesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Like
@@ -131,13 +150,7 @@ class LikeCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Like
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Like.objects.all(),
-                fields=('user', 'post'),
-                message="liked"
-            )
-        ]
+        validators = []
         fields = ('user', 'post')
 
 
@@ -148,24 +161,18 @@ class FollowCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Follow
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=('following', 'follower'),
-                message="following"
-            )
-        ]
+        validators = []
         fields = ('following', 'follower')
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Follow
         fields = '__all__'
 
 
-class SavesSerializer(serializers.ModelSerializer):
+class SavesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Save
@@ -179,76 +186,56 @@ class SaveCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Save
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Save.objects.all(),
-                fields=('user', 'post'),
-                message="saved"
-            )
-        ]
+        validators = []
         fields = ('user', 'post')
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     isMe = serializers.SerializerMethodField()
     isFollowing = serializers.SerializerMethodField()
-    posts = serializers.SerializerMethodField()
-    savedPosts = serializers.SerializerMethodField()
-    postCount = serializers.SerializerMethodField()
-    followers = serializers.SerializerMethodField()
-    following = serializers.SerializerMethodField()
-    followingCount = serializers.SerializerMethodField()
-    followersCount = serializers.SerializerMethodField()
 
     def get_isMe(self, instance):
         return self.context['request'].user.id == instance.id
 
     def get_isFollowing(self, instance):
-        return Follow.objects.filter(Q(following=instance.id) & Q(follower=self.context['request'].user.id)).exists()
-
-    def get_postCount(self, instance):
-        return Post.objects.filter(Q(user=instance.id)).count()
-        
-    def get_posts(self, instance):
-        user_posts = Post.objects.filter(Q(user=instance.id)).order_by('-createdAt')
-        userPosts_serializer = PostPreviewSerializer(user_posts, many=True, read_only=True)
-        return userPosts_serializer.data  
-
-    def get_followers(self, instance):
-        user_Follows = Follow.objects.filter(Q(following=instance.id)).values()
-        ids = []
-        for f in user_Follows:
-            ids.append(f['follower_id'])
-        followers = User.objects.filter(Q(id__in=ids))
-        userFollowers_serializer = UserSerializer(followers, many=True, read_only=True)
-        return userFollowers_serializer.data
-
-    def get_following(self, instance):
-        user_Follows = Follow.objects.filter(Q(follower=instance.id)).values()
-        ids = []
-        for f in user_Follows:
-            ids.append(f['following_id'])
-        followings = User.objects.filter(Q(id__in=ids))
-        userFollowings_serializer = UserSerializer(followings, many=True, read_only=True)
-        return userFollowings_serializer.data
-
-    def get_followingCount(self, instance):
-        return Follow.objects.filter(Q(follower=instance.id)).count()
-
-    def get_followersCount(self, instance):
-        return Follow.objects.filter(Q(following=instance.id)).count()
-
-    def get_savedPosts(self, instance):
-        user_Saves = Save.objects.filter(Q(user=instance.id)).values()
-        ids = []
-        for s in user_Saves:
-            ids.append(s['post_id'])
-        saved_posts = Post.objects.filter(Q(id__in=ids)).order_by('-createdAt')
-        savedPosts_serializer = PostPreviewSerializer(saved_posts, many=True, read_only=True)
-        return savedPosts_serializer.data 
+        return get_graph().is_following(self.context['request'].user.id, instance.id)
 
     class Meta:
         model = User
-        fields = ("id", "avatar", "nickname", "bio", "website", "isMe", "postCount", "isFollowing", "following", "followers", "first_name", "last_name", "followersCount", "followingCount", "posts", "savedPosts")
+        fields = ("id", "avatar", "nickname", "bio", "website", "isMe", "postCount", "isFollowing", "first_name", "last_name", "followersCount", "followingCount")
+        list_serializer_class = TimedListSerializer
+
+
+class SuggestionSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    user = UserSerializer()
+
+    class Meta:
+        model = Suggestion
+        fields = ('user', 'mutualCount')
+        list_serializer_class = TimedListSerializer
+
+
+class NotificationSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    actor = UserSerializer()
+
+    class Meta:
+        model = Notification
+        fields = ('id', 'actor', 'verb', 'post', 'createdAt')
+        list_serializer_class = TimedListSerializer
+
+
+class TagSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = Tag
+        fields = ('name', 'postCount')
+
+
+class TrendingTagSerializer(SparseFieldsMixin, serializers.Serializer):
+    name = serializers.CharField(source='tag__name')
+    count = serializers.IntegerField()
 
 
+class BulkActionSerializer(serializers.Serializer):
+    create = serializers.ListField(child=serializers.IntegerField(), required=False, default=list, max_length=BULK_MAX_ITEMS)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False, default=list, max_length=BULK_MAX_ITEMS)
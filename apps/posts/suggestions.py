@@ -0,0 +1,72 @@
+"""Suggested accounts, scored by mutual connections and precomputed by refresh_suggestions."""
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Follow, Suggestion
+from .feed import FANOUT_LIMIT
+from .graph import get_graph
+
+User = get_user_model()
+
+LIMIT = getattr(settings, 'SUGGESTIONS_LIMIT', 50)
+BATCH_SIZE = 500
+
+
+def candidates(user_id, graph):
+    """(user id, mutual count) pairs of the best friends-of-friends of `user_id`, best first."""
+    following = graph.following(user_id)
+    counts = Counter()
+    for followed_id in following:
+        counts.update(graph.following(followed_id))
+    counts.pop(user_id, None)
+    for followed_id in following:
+        counts.pop(followed_id, None)
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], -graph.followers_count(item[0]), item[0]))
+    return ranked[:LIMIT]
+
+
+def refresh_users(user_ids):
+    """Recompute and store the suggestions of `user_ids`."""
+    graph = get_graph()
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+        rows = [
+            Suggestion(owner_id=user_id, user_id=candidate_id, mutualCount=count)
+            for user_id in batch
+            for candidate_id, count in candidates(user_id, graph)
+        ]
+        with transaction.atomic():
+            Suggestion.objects.filter(owner__in=batch).delete()
+            Suggestion.objects.bulk_create(rows, batch_size=1000)
+            User.objects.filter(id__in=batch).update(suggestionsStale=False)
+
+
+def refresh_stale():
+    """Refresh every user marked stale; returns how many were refreshed."""
+    user_ids = list(User.objects.filter(suggestionsStale=True).values_list('id', flat=True))
+    refresh_users(user_ids)
+    return len(user_ids)
+
+
+def follows_changed(user_id):
+    """
+    Mark a user whose follows changed, and their followers, as stale.
+
+    Followers of pull authors are left to a full refresh, as there can be
+    too many of them to mark on every follow.
+    """
+    stale = Q(id=user_id)
+    if get_graph().followers_count(user_id) <= FANOUT_LIMIT:
+        stale |= Q(id__in=Follow.objects.filter(following=user_id).values('follower_id'))
+    User.objects.filter(stale).update(suggestionsStale=True)
+
+
+def get_suggestions(user_id):
+    """Stored suggestions for `user_id`, without accounts followed since they were computed."""
+    graph = get_graph()
+    suggestions = Suggestion.objects.filter(owner=user_id).select_related('user').order_by('-mutualCount', 'id')
+    return [suggestion for suggestion in suggestions if not graph.is_following(user_id, suggestion.user_id)]
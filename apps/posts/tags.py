@@ -0,0 +1,60 @@
+import re
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+
+from .models import Tag, PostTag, TagActivity
+
+# Trending tags are ranked by posts within this many hours.
+TRENDING_WINDOW = getattr(settings, 'TAG_TRENDING_WINDOW', 24)
+MAX_TAGS = 30
+
+TAGS_RE = re.compile(r'#?(\w+)', re.UNICODE)
+HASHTAG_RE = re.compile(r'#(\w+)', re.UNICODE)
+
+
+def parse_tags(post):
+    """Tag names of a post: every word of its tags field and every #hashtag in its caption."""
+    names = TAGS_RE.findall(post.tags or '') + HASHTAG_RE.findall(post.caption or '')
+    return list(dict.fromkeys(name.lower()[:100] for name in names))[:MAX_TAGS]
+
+
+def bucket_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def tag_post(post):
+    names = parse_tags(post)
+    if not names:
+        return
+    Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+    tag_ids = list(Tag.objects.filter(name__in=names).values_list('id', flat=True))
+    PostTag.objects.bulk_create([PostTag(tag_id=tag_id, post_id=post.id, createdAt=post.createdAt) for tag_id in tag_ids])
+    Tag.objects.filter(id__in=tag_ids).update(postCount=F('postCount') + 1)
+
+    bucket = bucket_of(post.createdAt)
+    TagActivity.objects.bulk_create([TagActivity(tag_id=tag_id, bucket=bucket) for tag_id in tag_ids], ignore_conflicts=True)
+    TagActivity.objects.filter(tag__in=tag_ids, bucket=bucket).update(count=F('count') + 1)
+
+
+def untag_post(post):
+    tag_ids = list(PostTag.objects.filter(post=post.id).values_list('tag_id', flat=True))
+    if not tag_ids:
+        return
+    Tag.objects.filter(id__in=tag_ids).update(postCount=F('postCount') - 1)
+    TagActivity.objects.filter(tag__in=tag_ids, bucket=bucket_of(post.createdAt)).update(count=F('count') - 1)
+
+
+def trending(limit=10, hours=TRENDING_WINDOW):
+    since = bucket_of(datetime.now() - timedelta(hours=hours))
+    return (
+        TagActivity.objects.filter(bucket__gte=since, count__gt=0)
+        .values('tag__name')
+        .annotate(count=Sum('count'))
+        .order_by('-count', 'tag__name')[:limit]
+    )
+
+
+def prune_activity(hours=TRENDING_WINDOW):
+    return TagActivity.objects.filter(bucket__lt=bucket_of(datetime.now() - timedelta(hours=hours))).delete()[0]
@@ -1,3 +1,1227 @@
-from django.test import TestCase
+import json
+import os
+import socket
+import tempfile
+import threading
+from base64 import urlsafe_b64encode
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+import psycopg2
+from psycopg2 import extensions
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from instagram.backends.postgresql_pool.pool import ConnectionPool, get_pool, pools
+from instagram.db import ReplicaRouter, replica_reads
+from instagram.performance import route_stats
+from instagram.renderers import ORJSONRenderer, MessagePackRenderer
+from .checks import check_replica_pin_cache
+from .models import Post, PostFile, PostTerm, Comment, Like, Save, Follow, FeedItem, EngagementIntent, OutboxEvent
+from .pagination import KeysetPagination
+from .views import LikeViewset, FollowViewset
+from . import async_views, caching, engagement, feed, graph, outbox, uploads, writebehind
+
+User = get_user_model()
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica1', 'replica2'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a@x.com', password='pw', nickname='a')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % AccessToken.for_user(self.user))
+        self.executed = []
+        self.wrappers = []
+        for alias in ('default', 'replica1', 'replica2'):
+            wrapper = connections[alias].execute_wrapper(self.recorder(alias))
+            wrapper.__enter__()
+            self.wrappers.append(wrapper)
+
+    def tearDown(self):
+        for wrapper in self.wrappers:
+            wrapper.__exit__(None, None, None)
+
+    def recorder(self, alias):
+        def record(execute, sql, params, many, context):
+            self.executed.append((alias, sql.split()[0]))
+            return execute(sql, params, many, context)
+        return record
+
+    def aliases(self):
+        return {alias for alias, _ in self.executed}
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Post), 'default')
+        with replica_reads():
+            self.assertIn(ReplicaRouter().db_for_read(Post), ('replica1', 'replica2'))
+
+    def test_transactions_use_primary(self):
+        with replica_reads(), transaction.atomic():
+            self.assertEqual(ReplicaRouter().db_for_read(Post), 'default')
+
+    def test_writes_use_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_write(Post), 'default')
+
+    def test_safe_requests_read_from_replicas(self):
+        for url in ('/feed/', '/post/', '/users/%d/' % self.user.id, '/postsearch/?search=x'):
+            self.executed.clear()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertTrue(self.aliases(), url)
+            self.assertNotIn('default', self.aliases(), url)
+
+    def test_writes_pin_client_to_primary(self):
+        response = self.client.post('/post/', {'caption': 'hello', 'files': []}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        self.executed.clear()
+        self.client.get('/post/')
+        self.assertEqual(self.aliases(), {'default'})
+
+        other = User.objects.create_user(username='b@x.com', password='pw', nickname='b')
+        other_client = APIClient()
+        other_client.credentials(HTTP_AUTHORIZATION='Bearer %s' % AccessToken.for_user(other))
+        self.executed.clear()
+        other_client.get('/post/')
+        self.assertNotIn('default', self.aliases())
+
+    def test_deploy_check_warns_about_process_local_pins(self):
+        self.assertEqual([warning.id for warning in check_replica_pin_cache(None)], ['posts.W002'])
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(check_replica_pin_cache(None), [])
+
+    def test_pin_expires(self):
+        self.client.post('/post/', {'caption': 'hello', 'files': []}, format='json')
+        cache.clear()
+        self.executed.clear()
+        self.client.get('/post/')
+        self.assertNotIn('default', self.aliases())
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Bearer %s' % AccessToken.for_user(user))
+    return client
+
+
+def cursor(position):
+    return urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+
+class APITests(TransactionTestCase):
+    databases = {'default', 'replica1', 'replica2'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a@x.com', password='pw', nickname='a')
+        self.other = User.objects.create_user(username='b@x.com', password='pw', nickname='b')
+        self.client = client_for(self.user)
+
+    def create_posts(self, user, count):
+        client = client_for(user)
+        for n in range(count):
+            response = client.post('/post/', {'caption': 'post %d' % n, 'files': []}, format='json')
+            self.assertEqual(response.status_code, 201)
+        return list(Post.objects.filter(user=user).order_by('-createdAt', '-id'))
+
+    def queries(self, url):
+        """Status of GET `url` and the number of queries it ran across every database."""
+        contexts = [CaptureQueriesContext(connections[alias]) for alias in sorted(self.databases)]
+        for context in contexts:
+            context.__enter__()
+        try:
+            response = self.client.get(url)
+        finally:
+            for context in contexts:
+                context.__exit__(None, None, None)
+        return response, sum(len(context) for context in contexts)
+
+
+class KeysetPaginationTests(APITests):
+
+    def test_pages_follow_the_ordering_without_gaps(self):
+        posts = self.create_posts(self.other, 5)
+        seen, url = [], '/post/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, [post.id for post in posts])
+
+    def test_malformed_cursor_is_not_found(self):
+        for value in ('not-base64!', cursor({'a': 1}), cursor([1])):
+            response = self.client.get('/post/', {'cursor': value})
+            self.assertEqual(response.status_code, 404, value)
+
+    def test_cursor_values_of_the_wrong_type_are_not_found(self):
+        self.create_posts(self.other, 1)
+        response = self.client.get('/post/', {'cursor': cursor(['yesterday', 'x'])})
+        self.assertEqual(response.status_code, 404)
+
+    def test_query_count_does_not_grow_with_page_depth(self):
+        for user in (self.user, self.other):
+            self.create_posts(user, 6)
+        Follow.objects.create(follower=self.user, following=self.other)
+        for url in ('/post/?page_size=3', '/feed/?page_size=3'):
+            first, first_queries = self.queries(url)
+            second, second_queries = self.queries(first.data['next'])
+            self.assertEqual(second.status_code, 200, url)
+            self.assertEqual(len(second.data['results']), 3, url)
+            self.assertEqual(first_queries, second_queries, url)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.create_posts(self.other, 8)
+        # The first request also caches the token's user.
+        self.client.get('/post/')
+        small, small_queries = self.queries('/post/?page_size=2')
+        large, large_queries = self.queries('/post/?page_size=8')
+        self.assertEqual(len(large.data['results']), 8)
+        self.assertEqual(small_queries, large_queries)
+
+
+class CounterTests(APITests):
+
+    def test_likes_and_follows_maintain_counters(self):
+        post = self.create_posts(self.other, 1)[0]
+        self.assertEqual(self.client.post('/like/', {'post': post.id}, format='json').status_code, 201)
+        self.assertEqual(self.client.post('/follow/', {'following': self.other.id}, format='json').status_code, 201)
+        post.refresh_from_db()
+        self.other.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(post.likesCount, 1)
+        self.assertEqual((self.other.postCount, self.other.followersCount, self.user.followingCount), (1, 1, 1))
+
+        self.assertEqual(self.client.delete('/like/%d/' % post.id).status_code, 204)
+        self.assertEqual(self.client.delete('/follow/%d/' % self.other.id).status_code, 204)
+        post.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(post.likesCount, 0)
+        self.assertEqual(self.other.followersCount, 0)
+
+    def test_bulk_likes_count_each_post_once(self):
+        posts = self.create_posts(self.other, 2)
+        ids = [post.id for post in posts]
+        response = self.client.post('/like/bulk/', {'create': ids + ids, 'delete': []}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(Post.objects.filter(id__in=ids).values_list('likesCount', flat=True)), [1, 1])
+
+    def test_concurrent_deletes_decrement_once(self):
+        post = self.create_posts(self.other, 1)[0]
+        self.client.post('/like/', {'post': post.id}, format='json')
+        self.client.post('/follow/', {'following': self.other.id}, format='json')
+        # Both requests loaded the row before either deleted it.
+        like = Like.objects.get()
+        follow = Follow.objects.get()
+        for n in range(2):
+            LikeViewset().perform_destroy(like)
+            FollowViewset().perform_destroy(follow)
+        self.assertEqual(Post.objects.get(id=post.id).likesCount, 0)
+        self.assertEqual(User.objects.get(id=self.other.id).followersCount, 0)
+
+    def test_bulk_writes_count_only_their_own_rows(self):
+        post = self.create_posts(self.other, 1)[0]
+        like = Like(user=self.user, post=post)
+        self.assertEqual(Like.objects.insert_new([like], ('user', 'post')), [(self.user.id, post.id)])
+        self.assertEqual(Like.objects.insert_new([like], ('user', 'post')), [])
+
+        self.assertEqual(engagement.like_posts(self.user.id, [post.id, 0]), {post.id: engagement.EXISTS, 0: engagement.NOT_FOUND})
+        self.assertEqual(engagement.unlike_posts(self.user.id, [post.id]), {post.id: engagement.DELETED})
+        self.assertEqual(engagement.unlike_posts(self.user.id, [post.id]), {post.id: engagement.ABSENT})
+        self.assertEqual(engagement.like_posts(self.user.id, [post.id]), {post.id: engagement.CREATED})
+        # The first like bypassed the counters, so one unlike and one like net to zero.
+        self.assertEqual(Post.objects.get(id=post.id).likesCount, 0)
+
+    def test_migration_backfills_counters(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('posts', '0015_feed_keyset_index')])
+        apps = executor.loader.project_state([('posts', '0015_feed_keyset_index')]).apps
+        HistoricalPost = apps.get_model('posts', 'Post')
+        post = HistoricalPost.objects.create(user_id=self.other.id, caption='old')
+        apps.get_model('posts', 'Like').objects.create(user_id=self.user.id, post_id=post.id)
+        apps.get_model('posts', 'Follow').objects.create(follower_id=self.user.id, following_id=self.other.id)
+
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        self.assertEqual(Post.objects.get(id=post.id).likesCount, 1)
+        other = User.objects.get(id=self.other.id)
+        self.assertEqual((other.postCount, other.followersCount), (1, 1))
+        self.assertEqual(User.objects.get(id=self.user.id).followingCount, 1)
+
+    def test_reconcile_counters_fixes_drift(self):
+        post = self.create_posts(self.other, 1)[0]
+        Like.objects.create(user=self.user, post=post)
+        Post.objects.filter(id=post.id).update(likesCount=7)
+        User.objects.filter(id=self.other.id).update(postCount=0)
+
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('Post.likesCount: 1 drifted', out.getvalue())
+        self.assertEqual(Post.objects.get(id=post.id).likesCount, 7)
+
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(Post.objects.get(id=post.id).likesCount, 1)
+        self.assertEqual(User.objects.get(id=self.other.id).postCount, 1)
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertNotIn(': 1 drifted', out.getvalue())
+
+
+@mock.patch.object(outbox, 'ENABLED', True)
+class OutboxTests(APITests):
+
+    def test_events_are_stored_and_handled_later(self):
+        post = self.create_posts(self.other, 1)[0]
+        self.client.post('/like/', {'post': post.id}, format='json')
+        self.assertEqual(Post.objects.get(id=post.id).likesCount, 0)
+        self.assertEqual(set(OutboxEvent.objects.values_list('topic', flat=True)), {'post.created', 'like.created'})
+
+        self.assertEqual(outbox.process(), 2)
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(Post.objects.get(id=post.id).likesCount, 1)
+        self.assertEqual(User.objects.get(id=self.other.id).postCount, 1)
+
+    def test_actor_sees_their_own_writes_before_events_are_handled(self):
+        post = self.create_posts(self.other, 1)[0]
+        outbox.process()
+        first = self.client.get('/post/%d/' % post.id)
+        profile = self.client.get('/users/%d/' % self.other.id)
+        self.client.post('/like/', {'post': post.id}, format='json')
+        response = self.client.post('/comment/', {'post': post.id, 'user': self.user.id, 'text': 'hi'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.client.post('/follow/', {'following': self.other.id}, format='json')
+
+        response = self.client.get('/post/%d/' % post.id, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertTrue(response.data['isLiked'])
+        self.assertEqual(len(response.data['comments']), 1)
+        self.assertTrue(self.client.get('/users/%d/' % self.other.id, HTTP_IF_NONE_MATCH=profile['ETag']).data['isFollowing'])
+
+        response = self.client.post('/like/bulk/', {'create': [], 'delete': [post.id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.client.get('/post/%d/' % post.id).data['isLiked'])
+
+    def test_events_roll_back_with_the_write(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            outbox.publish('like.created', pairs=[[self.user.id, 1]])
+            raise RuntimeError()
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_failed_events_are_retried_with_backoff(self):
+        post = self.create_posts(self.other, 1)[0]
+        OutboxEvent.objects.all().delete()
+        outbox.publish('like.created', pairs=[[self.user.id, post.id]])
+        with mock.patch.dict(outbox.HANDLERS, {'like.created': mock.Mock(side_effect=ValueError('boom'))}), self.assertLogs('posts.outbox'):
+            self.assertEqual(outbox.process(), 1)
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('boom', event.lastError)
+        self.assertGreater(event.availableAt, datetime.now())
+
+        # Not claimed again before its retry time.
+        self.assertEqual(outbox.process(), 0)
+        OutboxEvent.objects.update(availableAt=datetime.now() - timedelta(seconds=1))
+        self.assertEqual(outbox.process(), 1)
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(Post.objects.get(id=post.id).likesCount, 1)
+
+    def test_failed_handler_writes_are_rolled_back(self):
+        post = self.create_posts(self.other, 1)[0]
+        OutboxEvent.objects.all().delete()
+        outbox.publish('like.created', pairs=[[self.user.id, post.id]])
+
+        def failing(pairs):
+            outbox.like_created(pairs)
+            raise ValueError('after writing')
+        with mock.patch.dict(outbox.HANDLERS, {'like.created': failing}), self.assertLogs('posts.outbox'):
+            outbox.process()
+        self.assertEqual(Post.objects.get(id=post.id).likesCount, 0)
+
+    def test_exhausted_events_are_not_claimed(self):
+        outbox.publish('like.created', pairs=[[self.user.id, 1]])
+        OutboxEvent.objects.update(attempts=outbox.MAX_ATTEMPTS)
+        self.assertEqual(outbox.process(), 0)
+        self.assertEqual(outbox.stats(), {'pending': 0, 'failed': 1})
+
+    def test_claims_at_most_a_batch(self):
+        for n in range(3):
+            outbox.publish('like.deleted', pairs=[])
+        self.assertEqual(outbox.process(batch_size=2), 2)
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+
+@mock.patch.object(writebehind, 'ENABLED', True)
+class WriteBehindTests(APITests):
+
+    def test_merge_applies_the_last_intent_of_the_kind(self):
+        intents = {('like', 1): False, ('like', 3): True, ('save', 2): True}
+        self.assertEqual(writebehind.merge({1, 2}, intents, 'like'), {2, 3})
+
+    def test_flush_applies_the_last_intent_per_user_and_post(self):
+        liked, unliked = self.create_posts(self.other, 2)
+        Like.objects.create(user=self.user, post=unliked)
+        Post.objects.filter(id=unliked.id).update(likesCount=1)
+
+        self.client.post('/like/', {'post': liked.id}, format='json')
+        self.client.delete('/like/%d/' % liked.id)
+        self.client.post('/like/', {'post': liked.id}, format='json')
+        self.client.delete('/like/%d/' % unliked.id)
+        self.assertEqual(EngagementIntent.objects.count(), 4)
+        self.assertEqual(Post.objects.get(id=liked.id).likesCount, 0)
+
+        # Pending intents are already visible to the viewer.
+        response = self.client.get('/post/%d/' % liked.id)
+        self.assertTrue(response.data['isLiked'])
+
+        self.assertEqual(writebehind.flush(), 4)
+        self.assertFalse(EngagementIntent.objects.exists())
+        self.assertEqual(list(Like.objects.values_list('user_id', 'post_id')), [(self.user.id, liked.id)])
+        self.assertEqual(Post.objects.get(id=liked.id).likesCount, 1)
+        self.assertEqual(Post.objects.get(id=unliked.id).likesCount, 0)
+
+    def test_flush_ignores_likes_that_already_exist(self):
+        post = self.create_posts(self.other, 1)[0]
+        Like.objects.create(user=self.user, post=post)
+        Post.objects.filter(id=post.id).update(likesCount=1)
+        self.client.post('/like/', {'post': post.id}, format='json')
+        self.assertEqual(writebehind.flush(), 1)
+        self.assertEqual(Post.objects.get(id=post.id).likesCount, 1)
+
+
+class ConditionalResponseTests(APITests):
+
+    def test_unchanged_post_is_not_modified(self):
+        post = self.create_posts(self.other, 1)[0]
+        response = self.client.get('/post/%d/' % post.id)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get('/post/%d/' % post.id, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_writes_change_the_etag(self):
+        post = self.create_posts(self.other, 1)[0]
+        etag = self.client.get('/post/%d/' % post.id)['ETag']
+        self.client.post('/like/', {'post': post.id}, format='json')
+        response = self.client.get('/post/%d/' % post.id, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['likesCount'], 1)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_is_per_viewer(self):
+        self.create_posts(self.other, 1)
+        etag = self.client.get('/feed/')['ETag']
+        self.assertEqual(self.client.get('/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(client_for(self.other).get('/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class FollowGraphTests(APITests):
+
+    def setUp(self):
+        super().setUp()
+        self.third = User.objects.create_user(username='c@x.com', password='pw', nickname='c')
+        for follower, following in ((self.user, self.other), (self.user, self.third), (self.other, self.user), (self.third, self.other)):
+            Follow.objects.create(follower=follower, following=following)
+
+    def test_lookups(self):
+        follow_graph = graph.FollowGraph()
+        follow_graph.load()
+        self.assertTrue(follow_graph.is_following(self.user.id, self.other.id))
+        self.assertFalse(follow_graph.is_following(self.other.id, self.third.id))
+        self.assertTrue(follow_graph.is_mutual(self.user.id, self.other.id))
+        self.assertEqual(follow_graph.followers_count(self.other.id), 2)
+        self.assertEqual(follow_graph.common_following(self.user.id, self.third.id), [self.other.id])
+        self.assertEqual(follow_graph.mutuals(self.user.id), [self.other.id])
+        self.assertEqual(follow_graph.followed_among(self.user.id, [self.other.id, self.third.id, 0]), {self.other.id, self.third.id})
+
+    def test_flush_drops_the_graph(self):
+        # Loaded by an earlier test or by this one; post_migrate after each flush forgets it.
+        self.assertTrue(graph.get_graph().is_following(self.user.id, self.other.id))
+        call_command('flush', interactive=False, verbosity=0)
+        self.assertIsNone(graph.graph.seq)
+        self.assertFalse(graph.get_graph().is_following(self.user.id, self.other.id))
+
+    def test_concurrent_first_uses_load_once(self):
+        follow_graph = graph.FollowGraph()
+        loads = []
+        load = follow_graph._load
+
+        def counted():
+            loads.append(1)
+            load()
+        follow_graph._load = counted
+        threads = [threading.Thread(target=follow_graph.sync) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        connections.close_all()
+        self.assertEqual(len(loads), 1)
+        self.assertTrue(follow_graph.is_following(self.user.id, self.other.id))
+
+    def test_reloads_run_once_in_the_background(self):
+        follow_graph = graph.FollowGraph()
+        follow_graph.load()
+        Follow.objects.create(follower=self.other, following=self.third)
+        release = threading.Event()
+        load = follow_graph._load
+
+        def blocked():
+            release.wait(5)
+            load()
+        follow_graph._load = blocked
+        with mock.patch.object(graph, 'SHARED_CACHE', False), mock.patch.object(graph, 'RELOAD_INTERVAL', 0):
+            follow_graph.sync()
+            reloader = follow_graph.reloader
+            follow_graph.sync()
+            # The request did not wait, and the old graph still answers.
+            self.assertIs(follow_graph.reloader, reloader)
+            self.assertFalse(follow_graph.is_following(self.other.id, self.third.id))
+            release.set()
+            reloader.join()
+        self.assertTrue(follow_graph.is_following(self.other.id, self.third.id))
+
+    @mock.patch.object(graph, 'SHARED_CACHE', True)
+    def test_events_from_other_processes_are_applied(self):
+        follow_graph = graph.FollowGraph()
+        follow_graph.load()
+        with transaction.atomic():
+            graph.followed(self.other.id, [self.third.id])
+            graph.unfollowed(self.user.id, [self.other.id])
+        follow_graph.synced = 0
+        follow_graph.sync()
+        self.assertTrue(follow_graph.is_following(self.other.id, self.third.id))
+        self.assertFalse(follow_graph.is_following(self.user.id, self.other.id))
+        self.assertEqual(follow_graph.seq, cache.get('graph:seq'))
+        self.assertIsNone(follow_graph.reloader)
+
+    @mock.patch.object(graph, 'SHARED_CACHE', True)
+    def test_missing_events_are_retried_before_reloading(self):
+        follow_graph = graph.FollowGraph()
+        graph._publish(graph.FOLLOW, self.other.id, [self.third.id])
+        follow_graph.load()
+        seq = follow_graph.seq
+        cache.incr('graph:seq')
+        follow_graph.synced = 0
+        follow_graph.sync()
+        self.assertEqual(follow_graph.seq, seq)
+        self.assertIsNotNone(follow_graph.gap_since)
+        self.assertIsNone(follow_graph.reloader)
+
+        cache.set(graph._event_key(seq + 1), (seq + 1, graph.UNFOLLOW, self.user.id, self.other.id))
+        follow_graph.synced = 0
+        follow_graph.sync()
+        self.assertEqual(follow_graph.seq, seq + 1)
+        self.assertFalse(follow_graph.is_following(self.user.id, self.other.id))
+
+        cache.incr('graph:seq')
+        with mock.patch.object(graph, 'GAP_TIMEOUT', 0):
+            follow_graph.synced = 0
+            follow_graph.sync()
+            follow_graph.synced = 0
+            follow_graph.sync()
+        follow_graph.reloader.join()
+        self.assertEqual(follow_graph.seq, seq + 2)
+
+
+class ProfileListTests(APITests):
+
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' '.join(row[-1] for row in cursor.fetchall())
+
+    def test_saved_posts_are_paged_in_the_order_of_saving(self):
+        posts = self.create_posts(self.other, 3)
+        for post in posts:
+            Save.objects.create(user=self.user, post=post)
+        response = self.client.get('/users/%d/saved/?page_size=2' % self.user.id)
+        self.assertEqual([post['id'] for post in response.data['results']], [posts[2].id, posts[1].id])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([post['id'] for post in response.data['results']], [posts[0].id])
+
+    def test_async_profile_embeds_the_first_saved_page(self):
+        posts = self.create_posts(self.other, 2)
+        for post in posts:
+            Save.objects.create(user=self.user, post=post)
+        response = self.client.get('/async/users/%d/?page_size=1' % self.user.id)
+        self.assertEqual(response.status_code, 200)
+        saved = response.json()['savedPosts']
+        self.assertEqual([post['id'] for post in saved['results']], [posts[1].id])
+        response = self.client.get(saved['next'])
+        self.assertEqual([post['id'] for post in response.data['results']], [posts[0].id])
+
+    def test_pages_are_read_from_an_index(self):
+        pagination = KeysetPagination()
+        position = [datetime.now().isoformat(), 10 ** 6]
+        for queryset in (
+            Follow.objects.filter(following=self.other.id),
+            Follow.objects.filter(follower=self.user.id),
+            Save.objects.filter(user=self.user.id),
+        ):
+            page = queryset.order_by(*pagination.ordering).filter(pagination.get_position_filter(position))[:21]
+            plan = self.plan(page)
+            self.assertIn('keyset_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+class AsyncViewTests(APITests):
+
+    def server_timing_queries(self, response):
+        db = response['Server-Timing'].split(', ')[0]
+        return int(db.split('desc="')[1].split()[0])
+
+    def test_worker_queries_count_towards_server_timing(self):
+        self.create_posts(self.other, 2)
+        self.client.post('/follow/', {'following': self.other.id}, format='json')
+        response = self.client.get('/async/feed/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        # Authentication, the page, and its prefetches and batch queries.
+        self.assertGreaterEqual(self.server_timing_queries(response), 4)
+
+    def test_pooled_connections_are_released_after_each_task(self):
+        pooled = mock.Mock(settings_dict={'POOL': {}}, connection=object(), errors_occurred=False)
+        plain = mock.Mock(settings_dict={}, connection=object(), errors_occurred=False)
+        with mock.patch.object(async_views.connections, 'all', return_value=[pooled, plain]):
+            self.assertEqual(async_views._call(lambda value: value, 1), 1)
+        pooled.close.assert_called_once_with()
+        plain.close.assert_not_called()
+
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 24
+
+
+class UploadTests(APITests):
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings.enable()
+        self.post = self.create_posts(self.user, 1)[0]
+
+    def tearDown(self):
+        self.settings.disable()
+        self.media.cleanup()
+        super().tearDown()
+
+    def upload(self, *files):
+        return self.client.post('/post/%d/upload/' % self.post.id, {'files': list(files)}, format='multipart')
+
+    def test_files_are_stored_once_per_content(self):
+        response = self.upload(SimpleUploadedFile('a.png', PNG, 'image/png'), SimpleUploadedFile('b.PNG', PNG, 'image/png'))
+        self.assertEqual(response.status_code, 201)
+        ids = [upload['id'] for upload in response.data]
+        self.assertEqual(sorted(ids), sorted(PostFile.objects.values_list('id', flat=True)))
+        self.assertEqual(len({upload['url'] for upload in response.data}), 1)
+        self.assertTrue(response.data[0]['url'].endswith('.png'))
+        self.assertEqual(PostFile.objects.first().sha256, uploads.sha256_of(SimpleUploadedFile('c.png', PNG)))
+
+    def test_other_users_posts_are_forbidden(self):
+        self.client = client_for(self.other)
+        self.assertEqual(self.upload(SimpleUploadedFile('a.png', PNG, 'image/png')).status_code, 403)
+
+    def test_oversize_files_reject_the_upload(self):
+        with mock.patch.object(uploads, 'MAX_SIZE', len(PNG)):
+            response = self.upload(SimpleUploadedFile('ok.png', PNG, 'image/png'), SimpleUploadedFile('big.png', PNG * 2, 'image/png'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('big.png', str(response.data['files']))
+        self.assertFalse(PostFile.objects.exists())
+
+    def test_only_media_is_accepted(self):
+        for upload in (
+            SimpleUploadedFile('page.html', b'<script>alert(1)</script>', 'text/html'),
+            SimpleUploadedFile('image.svg', b'<svg onload="alert(1)"/>', 'image/svg+xml'),
+            SimpleUploadedFile('page.png', b'<script>alert(1)</script>', 'image/png'),
+            SimpleUploadedFile('image.png', PNG, 'text/html'),
+            SimpleUploadedFile('image.jpg', PNG, 'image/jpeg'),
+        ):
+            response = self.upload(upload)
+            self.assertEqual(response.status_code, 400, upload.name)
+        self.assertFalse(PostFile.objects.exists())
+
+
+class PerformanceTests(APITests):
+
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        route_stats.clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get('/post/')
+        self.assertEqual(response.status_code, 200)
+        timings = [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+        self.assertEqual(timings, ['db', 'serialize', 'total'])
+
+    def test_route_summary_is_labelled_with_its_process(self):
+        self.create_posts(self.user, 2)
+        for n in range(3):
+            self.client.get('/post/')
+        response = self.client.get('/performance/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['host'], response.data['pid']), (socket.gethostname(), os.getpid()))
+        routes = response.data['routes']
+        self.assertEqual(routes['GET post-list']['count'], 3)
+        self.assertEqual(routes['POST post-list']['count'], 2)
+        self.assertLessEqual(routes['GET post-list']['p50'], routes['GET post-list']['p99'])
+
+    def test_staff_only(self):
+        response = client_for(self.other).get('/performance/')
+        self.assertEqual(response.status_code, 403)
+
+
+class TagTests(APITests):
+
+    def create_tagged(self, user, caption, tags=''):
+        response = client_for(user).post('/post/', {'caption': caption, 'tags': tags, 'files': []}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Post.objects.filter(user=user).latest('id').id
+
+    def test_tags_from_caption_and_tags_field(self):
+        post_id = self.create_tagged(self.user, 'at the beach #Sunset #sunset', 'beach')
+        response = self.client.get('/tags/Sunset/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'name': 'sunset', 'postCount': 1})
+        self.assertEqual(self.client.get('/tags/beach/').data['postCount'], 1)
+
+        response = self.client.get('/tags/Sunset/posts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['id'] for post in response.data['results']], [post_id])
+
+    def test_deleting_a_post_untags_it(self):
+        post_id = self.create_tagged(self.user, '#sunset')
+        self.assertEqual(self.client.delete('/post/%d/' % post_id).status_code, 204)
+        self.assertEqual(self.client.get('/tags/sunset/').data['postCount'], 0)
+        self.assertEqual(self.client.get('/tags/sunset/posts/').data['results'], [])
+
+    def test_trending(self):
+        for n in range(2):
+            self.create_tagged(self.user, '#sunset')
+        self.create_tagged(self.other, '#beach')
+        response = self.client.get('/tags/trending/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([dict(tag) for tag in response.data], [{'name': 'sunset', 'count': 2}, {'name': 'beach', 'count': 1}])
+
+    def test_unknown_tag(self):
+        self.assertEqual(self.client.get('/tags/nothing/').status_code, 404)
+
+
+class FeedTests(APITests):
+
+    def feed_ids(self, client=None):
+        response = (client or self.client).get('/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.data['results']]
+
+    def follow(self, user):
+        self.assertEqual(self.client.post('/follow/', {'following': user.id}, format='json').status_code, 201)
+
+    def test_fan_out_on_write(self):
+        older = self.create_posts(self.other, 2)
+        own = self.create_posts(self.user, 1)
+        self.follow(self.other)
+        newer = self.create_posts(self.other, 3)[:3]
+        self.assertEqual(self.feed_ids(), [post.id for post in newer + own + older])
+        self.assertEqual(FeedItem.objects.filter(owner=self.user).count(), 6)
+
+        self.assertEqual(self.client.delete('/follow/%d/' % self.other.id).status_code, 204)
+        self.assertEqual(self.feed_ids(), [post.id for post in own])
+
+    def test_pull_authors_are_read_at_request_time(self):
+        with mock.patch.object(feed, 'FANOUT_LIMIT', 0):
+            self.follow(self.other)
+            posts = self.create_posts(self.other, 3)
+            self.assertFalse(FeedItem.objects.filter(owner=self.user).exists())
+            own = self.create_posts(self.user, 1)
+            self.assertEqual(self.feed_ids(), [post.id for post in own + posts])
+
+            response = self.client.get('/feed/?page_size=2')
+            self.assertEqual([post['id'] for post in response.data['results']], [post.id for post in (own + posts)[:2]])
+            response = self.client.get(response.data['next'])
+            self.assertEqual([post['id'] for post in response.data['results']], [post.id for post in posts[1:]])
+
+    def test_trim_and_rebuild(self):
+        self.follow(self.other)
+        posts = self.create_posts(self.other, 4)
+        # The author's own feed is trimmed too.
+        self.assertEqual(feed.trim_feeds(size=2), 4)
+        self.assertEqual(self.feed_ids(), [post.id for post in posts[:2]])
+
+        feed.rebuild_feed(self.user.id)
+        caching.invalidate(('feed', self.user.id))
+        self.assertEqual(self.feed_ids(), [post.id for post in posts])
+
+
+class BatchSerializationTests(APITests):
+
+    def create_engaged_posts(self, count):
+        posts = self.create_posts(self.other, count)[:count]
+        for post in posts:
+            PostFile.objects.create(post=post, user=self.other, url='/media/%d.jpg' % post.id)
+            Comment.objects.create(post=post, user=self.other, text='on %d' % post.id)
+        Like.objects.bulk_create([Like(user=self.user, post=post) for post in posts[::2]])
+        Save.objects.bulk_create([Save(user=self.user, post=post) for post in posts[1::2]])
+        return posts
+
+    def test_list_queries_do_not_grow_with_the_page(self):
+        self.create_engaged_posts(2)
+        # The first request also caches the token user.
+        self.client.get('/users/%d/' % self.user.id)
+        response, small = self.queries('/post/')
+        self.assertEqual(len(response.data['results']), 2)
+        self.create_engaged_posts(8)
+        response, large = self.queries('/post/')
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(small, large)
+
+        response, small = self.queries('/users/%d/posts/?page_size=2' % self.other.id)
+        response, large = self.queries('/users/%d/posts/?page_size=10' % self.other.id)
+        self.assertEqual((len(response.data['results']), small), (10, large))
+
+    def test_viewer_state_and_relations(self):
+        posts = self.create_engaged_posts(3)
+        results = {post['id']: post for post in self.client.get('/post/').data['results']}
+        for n, post in enumerate(posts):
+            data = results[post.id]
+            self.assertEqual((data['isLiked'], data['isSaved']), (n % 2 == 0, n % 2 == 1))
+            self.assertEqual([f['url'] for f in data['files']], ['/media/%d.jpg' % post.id])
+            self.assertEqual([c['text'] for c in data['comments']], ['on %d' % post.id])
+            self.assertEqual(data['user']['nickname'], 'b')
+
+        # Another viewer sees their own state.
+        results = client_for(self.other).get('/post/').data['results']
+        self.assertFalse(any(post['isLiked'] or post['isSaved'] for post in results))
+
+
+class ConstraintTests(APITests):
+
+    def test_duplicates_are_rejected_by_the_database(self):
+        post = self.create_posts(self.other, 1)[0]
+        for model, fields in ((Like, {'user': self.user, 'post': post}), (Save, {'user': self.user, 'post': post}),
+                              (Follow, {'follower': self.user, 'following': self.other})):
+            model.objects.create(**fields)
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                model.objects.create(**fields)
+
+    def test_repeated_creates_are_no_ops(self):
+        post = self.create_posts(self.other, 1)[0]
+        for n in range(2):
+            self.assertEqual(self.client.post('/like/', {'post': post.id}, format='json').status_code, 201)
+            self.assertEqual(self.client.post('/save/', {'post': post.id}, format='json').status_code, 201)
+            self.assertEqual(self.client.post('/follow/', {'following': self.other.id}, format='json').status_code, 201)
+        self.assertEqual((Like.objects.count(), Save.objects.count(), Follow.objects.count()), (1, 1, 1))
+        post.refresh_from_db()
+        self.assertEqual((post.likesCount, post.savesCount), (1, 1))
+        self.assertEqual(User.objects.get(id=self.other.id).followersCount, 1)
+
+    def test_migration_removes_duplicates(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('posts', '0007_counters')])
+        apps = executor.loader.project_state([('posts', '0007_counters')]).apps
+        post = apps.get_model('posts', 'Post').objects.create(user_id=self.other.id, caption='old')
+        HistoricalLike = apps.get_model('posts', 'Like')
+        first = HistoricalLike.objects.create(user_id=self.user.id, post_id=post.id)
+        HistoricalLike.objects.create(user_id=self.user.id, post_id=post.id)
+        HistoricalLike.objects.create(user_id=self.other.id, post_id=post.id)
+
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        self.assertEqual(sorted(Like.objects.values_list('user_id', flat=True)), [self.user.id, self.other.id])
+        self.assertTrue(Like.objects.filter(id=first.id).exists())
+
+
+class SearchTests(APITests):
+    # The test database is SQLite, so this exercises the PostTerm index; the
+    # PostgreSQL tsvector path shares the view and the keyset ordering.
+
+    def setUp(self):
+        super().setUp()
+        client = client_for(self.other)
+        for caption, tags in (('Sunset at the beach', ''), ('beach day', 'sunset'), ('mountains', '')):
+            self.assertEqual(client.post('/post/', {'caption': caption, 'tags': tags, 'files': []}, format='json').status_code, 201)
+        self.posts = {post.caption: post.id for post in Post.objects.all()}
+
+    def search(self, text, **params):
+        response = self.client.get('/postsearch/', dict(params, search=text))
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.data['results']], response.data['next']
+
+    def test_prefix_words_ranked_by_where_they_match(self):
+        self.assertEqual(self.search('SUN')[0], [self.posts['Sunset at the beach'], self.posts['beach day']])
+        self.assertEqual(self.search('sun beach')[0], [self.posts['Sunset at the beach'], self.posts['beach day']])
+        self.assertEqual(self.search('mount')[0], [self.posts['mountains']])
+        self.assertEqual(self.search('sun mount')[0], [])
+
+    def test_pages_follow_the_rank(self):
+        ids, next_url = self.search('sunset', page_size=1)
+        self.assertEqual(ids, [self.posts['Sunset at the beach']])
+        response = self.client.get(next_url)
+        self.assertEqual([post['id'] for post in response.data['results']], [self.posts['beach day']])
+        self.assertIsNone(response.data['next'])
+
+    def test_without_text_lists_every_post(self):
+        self.assertEqual(sorted(self.search('')[0]), sorted(self.posts.values()))
+
+    def test_rebuild_index(self):
+        PostTerm.objects.all().delete()
+        self.assertEqual(self.search('beach')[0], [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('indexed 3 posts', out.getvalue())
+        self.assertEqual(len(self.search('beach')[0]), 2)
+
+
+class ResponseCacheTests(APITests):
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        self.create_posts(self.user, 2)
+        response, queries = self.queries('/feed/')
+        self.assertEqual((response.status_code, response['X-Cache']), (200, 'MISS'))
+        hit, cached_queries = self.queries('/feed/')
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        self.assertEqual(hit.data, response.data)
+        self.assertLess(cached_queries, queries)
+        # Responses are cached per viewer.
+        self.assertEqual(client_for(self.other).get('/feed/')['X-Cache'], 'MISS')
+
+    def test_followers_feeds_are_invalidated_by_new_posts(self):
+        self.client.post('/follow/', {'following': self.other.id}, format='json')
+        self.assertEqual(self.client.get('/feed/').data['results'], [])
+        self.assertEqual(self.client.get('/feed/')['X-Cache'], 'HIT')
+        post = self.create_posts(self.other, 1)[0]
+        response = self.client.get('/feed/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([data['id'] for data in response.data['results']], [post.id])
+
+    def test_profile_updates_invalidate(self):
+        url = '/users/%d/' % self.user.id
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.assertEqual(self.client.put(url, {'nickname': 'renamed'}, format='json').status_code, 200)
+        response = client_for(self.other).get(url)
+        self.assertEqual(response.data['nickname'], 'renamed')
+        self.assertEqual(self.client.get(url).data['nickname'], 'renamed')
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.client.get('/post/1000/').status_code, 404)
+        # Created without invalidating anything, so only an uncached 404 lets it show.
+        Post.objects.create(id=1000, user=self.other, caption='late')
+        self.assertEqual(self.client.get('/post/1000/').status_code, 200)
+
+    def test_stats(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        for n in range(3):
+            self.client.get('/feed/')
+        stats = self.client.get('/cachestats/').data
+        self.assertEqual((stats['feed']['hits'], stats['feed']['misses']), (2, 1))
+        self.assertEqual(client_for(self.other).get('/cachestats/').status_code, 403)
+
+
+class BulkTests(APITests):
+
+    def bulk(self, prefix, create=(), delete=()):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/%s/bulk/' % prefix, {'create': list(create), 'delete': list(delete)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = {kind: {item['id']: item['result'] for item in response.data[kind]} for kind in ('create', 'delete')}
+        return results, len(queries)
+
+    def test_statements_do_not_grow_with_the_list(self):
+        posts = self.create_posts(self.other, 10)
+        # The first request also caches the token user.
+        self.client.get('/users/%d/' % self.user.id)
+        results, few = self.bulk('like', create=[posts[0].id])
+        results, many = self.bulk('like', create=[post.id for post in posts[1:]])
+        self.assertEqual(set(results['create'].values()), {engagement.CREATED})
+        self.assertEqual(few, many)
+        self.assertEqual(Post.objects.filter(likesCount=1).count(), 10)
+
+    def test_create_and_delete_in_one_request(self):
+        first, second = self.create_posts(self.other, 2)
+        self.client.post('/save/', {'post': first.id}, format='json')
+        results, queries = self.bulk('save', create=[first.id, second.id, 0], delete=[first.id, 0])
+        self.assertEqual(results['create'], {first.id: engagement.EXISTS, second.id: engagement.CREATED, 0: engagement.NOT_FOUND})
+        self.assertEqual(results['delete'], {first.id: engagement.DELETED, 0: engagement.ABSENT})
+        self.assertEqual(list(Save.objects.values_list('post_id', flat=True)), [second.id])
+        self.assertEqual([Post.objects.get(id=post.id).savesCount for post in (first, second)], [0, 1])
+
+    def test_bulk_follows(self):
+        third = User.objects.create_user(username='c@x.com', password='pw', nickname='c')
+        posts = self.create_posts(third, 2)
+        results, queries = self.bulk('follow', create=[self.other.id, third.id])
+        self.assertEqual(set(results['create'].values()), {engagement.CREATED})
+        self.assertEqual(User.objects.get(id=self.user.id).followingCount, 2)
+        self.assertEqual(list(graph.get_graph().following(self.user.id)), [self.other.id, third.id])
+        self.assertEqual([post['id'] for post in self.client.get('/feed/').data['results']], [post.id for post in posts])
+
+        results, queries = self.bulk('follow', delete=[third.id])
+        self.assertEqual(results['delete'], {third.id: engagement.DELETED})
+        self.assertEqual(self.client.get('/feed/').data['results'], [])
+
+    def test_lists_are_capped(self):
+        response = self.client.post('/like/bulk/', {'create': list(range(1, 502))}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_post_files_are_inserted_together(self):
+        files = [{'url': '/media/%d.jpg' % n} for n in range(3)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/post/', {'caption': 'three', 'files': files}, format='json')
+        self.assertEqual(response.status_code, 201)
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT INTO "posts_postfile"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(PostFile.objects.filter(post__caption='three').count(), 3)
+
+
+class SuggestionTests(APITests):
+
+    def setUp(self):
+        super().setUp()
+        self.c, self.d, self.e = [
+            User.objects.create_user(username='%s@x.com' % name, password='pw', nickname=name) for name in 'cde'
+        ]
+        for follower, following in ((self.user, self.other), (self.user, self.c), (self.other, self.d),
+                                    (self.c, self.d), (self.c, self.e)):
+            response = client_for(follower).post('/follow/', {'following': following.id}, format='json')
+            self.assertEqual(response.status_code, 201)
+
+    def suggested(self):
+        response = self.client.get('/users/suggestions/')
+        self.assertEqual(response.status_code, 200)
+        return [(item['user']['nickname'], item['mutualCount']) for item in response.data]
+
+    def test_friends_of_friends_ranked_by_mutual_follows(self):
+        self.assertEqual(self.suggested(), [])
+        out = StringIO()
+        call_command('refresh_suggestions', stdout=out)
+        self.assertIn('refreshed suggestions for 5 users', out.getvalue())
+        self.assertEqual(self.suggested(), [('d', 2), ('e', 1)])
+
+    def test_followed_accounts_drop_out_before_the_refresh(self):
+        call_command('refresh_suggestions', stdout=StringIO())
+        self.client.post('/follow/', {'following': self.d.id}, format='json')
+        self.assertEqual(self.suggested(), [('e', 1)])
+
+    def test_follows_mark_followers_stale(self):
+        call_command('refresh_suggestions', stdout=StringIO())
+        self.assertFalse(User.objects.filter(suggestionsStale=True).exists())
+        client_for(self.other).post('/follow/', {'following': self.e.id}, format='json')
+        self.assertEqual(set(User.objects.filter(suggestionsStale=True).values_list('id', flat=True)), {self.user.id, self.other.id})
+        call_command('refresh_suggestions', stdout=StringIO())
+        self.assertEqual(self.suggested(), [('d', 2), ('e', 2)])
+
+
+class CommentTests(APITests):
+
+    def setUp(self):
+        super().setUp()
+        self.post, self.quiet = self.create_posts(self.other, 2)
+        start = datetime(2026, 1, 1)
+        self.comments = [
+            Comment.objects.create(post=self.post, user=self.other, text='c%d' % n, createdAt=start + timedelta(minutes=n))
+            for n in range(5)
+        ]
+
+    def test_posts_preview_their_latest_comments(self):
+        response = self.client.get('/post/%d/' % self.post.id)
+        self.assertEqual([comment['text'] for comment in response.data['comments']], ['c4', 'c3', 'c2'])
+        self.assertEqual(response.data['comments'][0]['user']['nickname'], 'b')
+        self.assertEqual(self.client.get('/post/%d/' % self.quiet.id).data['comments'], [])
+
+    def test_thread_is_paginated(self):
+        response = self.client.get('/post/%d/comments/?page_size=2' % self.post.id)
+        texts = [comment['text'] for comment in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            texts.extend(comment['text'] for comment in response.data['results'])
+        self.assertEqual(texts, ['c4', 'c3', 'c2', 'c1', 'c0'])
+
+    def test_new_and_deleted_comments_show_in_the_preview(self):
+        self.client.get('/post/%d/' % self.post.id)
+        response = self.client.post('/comment/', {'post': self.post.id, 'user': self.user.id, 'text': 'new'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        data = self.client.get('/post/%d/' % self.post.id).data
+        # The comments made in setUp bypassed the counter.
+        self.assertEqual(([comment['text'] for comment in data['comments']], data['commentsCount']), (['new', 'c4', 'c3'], 1))
+
+        comment = Comment.objects.get(text='new')
+        self.assertEqual(self.client.delete('/comment/%d/' % comment.id).status_code, 204)
+        self.assertEqual([comment['text'] for comment in self.client.get('/post/%d/' % self.post.id).data['comments']], ['c4', 'c3', 'c2'])
+
+    def test_comment_list_validates_the_post_filter(self):
+        self.assertEqual(self.client.get('/comment/?post=x').status_code, 400)
+        self.assertEqual(len(self.client.get('/comment/?post=%d' % self.post.id).data['results']), 5)
+
+
+class SparseFieldsTests(APITests):
+
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_posts(self.other, 1)[0]
+        Comment.objects.create(post=self.post, user=self.other, text='hi')
+
+    def test_fields_and_exclude(self):
+        data = self.client.get('/post/?fields=id,likesCount,user').data['results'][0]
+        self.assertEqual(set(data), {'id', 'likesCount', 'user'})
+        # Nested serializers keep all their fields.
+        self.assertIn('nickname', data['user'])
+
+        data = self.client.get('/post/?exclude=comments,isSaved').data['results'][0]
+        self.assertNotIn('comments', data)
+        self.assertNotIn('isSaved', data)
+        self.assertIn('isLiked', data)
+
+    def test_skipped_fields_are_not_loaded(self):
+        # The first request also caches the token user.
+        self.client.get('/users/%d/' % self.user.id)
+        response, full = self.queries('/post/')
+        response, sparse = self.queries('/post/?fields=id,caption')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'caption'})
+        # No user, files, likes, saves or comments queries.
+        self.assertEqual(full - sparse, 5)
+
+    def test_cached_responses_are_kept_per_field_set(self):
+        url = '/post/%d/' % self.post.id
+        self.assertIn('comments', self.client.get(url).data)
+        response = self.client.get(url + '?fields=id')
+        self.assertEqual((response['X-Cache'], response.data), ('MISS', {'id': self.post.id}))
+
+
+class RendererTests(APITests):
+
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_posts(self.other, 1)[0]
+        self.url = '/post/%d/' % self.post.id
+
+    def test_json_matches_drf(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content), json.loads(JSONRenderer().render(response.data)))
+
+    def test_values_drf_converts(self):
+        data = {'at': datetime(2026, 1, 2, 3, 4, 5), 'price': Decimal('1.50'), 1: 'key'}
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render(data), strict_map_key=False),
+                         {'at': '2026-01-02T03:04:05', 'price': 1.5, 1: 'key'})
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_msgpack_by_accept_header_or_format(self):
+        expected = json.loads(self.client.get(self.url).content)
+        for response in (self.client.get(self.url, HTTP_ACCEPT='application/msgpack'), self.client.get(self.url + '?format=msgpack')):
+            self.assertEqual(response['Content-Type'], 'application/msgpack')
+            self.assertEqual(msgpack.unpackb(response.content), expected)
+
+    def test_etag_varies_with_the_format(self):
+        response = self.client.get(self.url)
+        self.assertIn('Accept', response['Vary'])
+        response = self.client.get(self.url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+
+class FakeConnection:
+
+    def __init__(self, in_transaction=False, broken=False):
+        self.closed = False
+        self.status = extensions.TRANSACTION_STATUS_INTRANS if in_transaction else extensions.TRANSACTION_STATUS_IDLE
+        self.broken = broken
+        self.rolled_back = False
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        if self.broken:
+            raise psycopg2.InterfaceError('connection already closed')
+        self.rolled_back = True
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    @contextmanager
+    def cursor(self):
+        if self.broken:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        yield mock.Mock()
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def test_released_connections_are_reused(self):
+        pool = ConnectionPool(size=2)
+        first, waited = pool.acquire(FakeConnection)
+        pool.release(first)
+        self.assertIs(pool.acquire(FakeConnection)[0], first)
+        self.assertEqual((pool.stats()['checkouts'], pool.stats()['connects']), (2, 1))
+
+    def test_checkouts_wait_for_a_free_slot(self):
+        pool = ConnectionPool(size=1, timeout=0.01)
+        connection, waited = pool.acquire(FakeConnection)
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.acquire(FakeConnection)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+        pool.release(connection)
+        self.assertIs(pool.acquire(FakeConnection)[0], connection)
+
+    def test_open_transactions_are_rolled_back_on_release(self):
+        pool = ConnectionPool()
+        connection = pool.acquire(lambda: FakeConnection(in_transaction=True))[0]
+        pool.release(connection)
+        self.assertTrue(connection.rolled_back)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def test_broken_and_expired_connections_are_closed(self):
+        pool = ConnectionPool(max_lifetime=60)
+        broken = pool.acquire(lambda: FakeConnection(in_transaction=True, broken=True))[0]
+        pool.release(broken)
+        self.assertTrue(broken.closed)
+
+        old = pool.acquire(FakeConnection)[0]
+        pool.created_at[old] -= 120
+        pool.release(old)
+        self.assertTrue(old.closed)
+        self.assertEqual(pool.stats(), dict(pool.stats(), open=0, idle=0, discarded=2))
+
+    def test_idle_connections_are_pinged(self):
+        pool = ConnectionPool()
+        connection = pool.acquire(FakeConnection)[0]
+        pool.release(connection)
+        connection.broken = True
+        fresh = pool.acquire(FakeConnection)[0]
+        self.assertIsNot(fresh, connection)
+        self.assertTrue(connection.closed)
+
+    def test_failed_connects_free_their_slot(self):
+        pool = ConnectionPool(size=1, timeout=0.01)
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.acquire(mock.Mock(side_effect=psycopg2.OperationalError('refused')))
+        pool.acquire(FakeConnection)
+
+    def test_one_pool_per_alias(self):
+        with mock.patch.dict(pools, clear=True):
+            pool = get_pool('default', {'POOL': {'SIZE': 3, 'PRE_PING': False}})
+            self.assertIs(get_pool('default', {}), pool)
+            self.assertEqual((pool.size, pool.pre_ping), (3, False))
+            self.assertIsNot(get_pool('replica1', {}), pool)
@@ -0,0 +1,118 @@
+"""Media uploads, hashed while they stream in and stored under their digest."""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler, SkipFile
+from django.db import connection
+
+from .models import PostFile
+
+# Files larger than this are dropped while they stream in, and the upload is rejected.
+MAX_SIZE = getattr(settings, 'MEDIA_UPLOAD_MAX_SIZE', 50 * 1024 * 1024)
+MAX_FILES = 10
+PREFIX = 'posts'
+
+# The only files accepted, by extension: the content type the client must
+# declare, and where in the file one of the signatures of that format starts.
+# Anything else (HTML, SVG, scripts) would be served from MEDIA_URL on the
+# site's own origin.
+MEDIA_TYPES = {
+    '.jpg': ('image/jpeg', 0, (b'\xff\xd8\xff',)),
+    '.jpeg': ('image/jpeg', 0, (b'\xff\xd8\xff',)),
+    '.png': ('image/png', 0, (b'\x89PNG\r\n\x1a\n',)),
+    '.gif': ('image/gif', 0, (b'GIF87a', b'GIF89a')),
+    '.webp': ('image/webp', 8, (b'WEBP',)),
+    '.mp4': ('video/mp4', 4, (b'ftyp',)),
+    '.mov': ('video/quicktime', 4, (b'ftyp', b'moov', b'wide', b'mdat')),
+    '.webm': ('video/webm', 0, (b'\x1a\x45\xdf\xa3',)),
+}
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """Writes each uploaded file to disk chunk by chunk, computing its SHA-256 on the way."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > MAX_SIZE:
+            # Recorded so the view can reject the request instead of dropping the file silently.
+            self.request.skipped_uploads = skipped_uploads(self.request) + [self.file_name]
+            raise SkipFile()
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self.digest.hexdigest()
+        return upload
+
+
+def skipped_uploads(request):
+    """Names of the files HashingFileUploadHandler dropped from `request` for exceeding MAX_SIZE."""
+    return getattr(request, 'skipped_uploads', [])
+
+
+def extension_of(filename):
+    return os.path.splitext(filename or '')[1].lower()
+
+
+def is_media(upload):
+    """Whether `upload` has an allowed extension, the matching content type and content that looks like it."""
+    media_type = MEDIA_TYPES.get(extension_of(upload.name))
+    if media_type is None:
+        return False
+    content_type, offset, signatures = media_type
+    if (upload.content_type or '').split(';')[0].strip().lower() != content_type:
+        return False
+    upload.seek(0)
+    head = upload.read(16)
+    upload.seek(0)
+    return head[offset:].startswith(signatures)
+
+
+def sha256_of(upload):
+    """The digest recorded while streaming, or computed from the file's chunks for other upload handlers."""
+    digest = getattr(upload, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in upload.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+    return digest
+
+
+def storage_name(digest, filename):
+    extension = extension_of(filename)
+    return '%s/%s/%s/%s%s' % (PREFIX, digest[:2], digest[2:4], digest, extension)
+
+
+def store(upload):
+    """Store an uploaded file unless identical content is stored already; returns (sha256, url)."""
+    digest = sha256_of(upload)
+    url = PostFile.objects.filter(sha256=digest).values_list('url', flat=True).first()
+    if url is not None:
+        return digest, url
+    name = storage_name(digest, upload.name)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, upload)
+    return digest, default_storage.url(name)
+
+
+def save_files(post, user_id, uploads):
+    """Store `uploads` and record them as files of `post`."""
+    files = []
+    for upload in uploads:
+        digest, url = store(upload)
+        files.append(PostFile(post=post, user_id=user_id, url=url, sha256=digest, size=upload.size))
+    if connection.features.can_return_rows_from_bulk_insert:
+        return PostFile.objects.bulk_create(files)
+    # Without RETURNING, bulk_create leaves the ids unset.
+    for file in files:
+        file.save(force_insert=True)
+    return files
@@ -1,21 +1,67 @@
-from rest_framework import mixins, viewsets, permissions, filters
-from rest_framework_simplejwt.authentication import JWTAuthentication
+import functools
+
+from rest_framework import mixins, viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.generics import get_object_or_404
+from rest_framework.exceptions import ValidationError, PermissionDenied
+from rest_framework.parsers import MultiPartParser
 from rest_framework.authentication import SessionAuthentication
-from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model
+from django.db import transaction
 
-from .serializers import UserProfileSerializer, PostCreateSerializer, PostSerializer, CommentCreateSerializer, CommentsSerializer, FollowCreateSerializer, FollowSerializer, LikeCreateSerializer, LikesSerializer, SaveCreateSerializer, SavesSerializer, PostPreviewSerializer
-from .models import Post, Comment, Follow, Like, Save
+from .serializers import UserProfileSerializer, PostCreateSerializer, PostSerializer, CommentCreateSerializer, CommentsSerializer, FollowCreateSerializer, FollowSerializer, LikeCreateSerializer, LikesSerializer, SaveCreateSerializer, SavesSerializer, PostPreviewSerializer, TagSerializer, TrendingTagSerializer, BulkActionSerializer, SuggestionSerializer, NotificationSerializer, FilesSerializer
+from .models import Post, Comment, Follow, Like, Save, Tag, PostTag, EngagementIntent, Notification
+from .pagination import KeysetPagination
 from users.serializers import UserSerializer
+from users.authentication import TokenUserAuthentication
+from . import feed, search, tags, caching, engagement, graph, suggestions, writebehind, outbox, uploads
+from instagram.performance import route_stats
+from instagram.backends.postgresql_pool.pool import pools
 
 User = get_user_model()
 
 # Create your views here.
 
-class PostViewset(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
-    authentication_classes = (JWTAuthentication, SessionAuthentication)
+class PaginatedActionMixin:
+
+    def paginated(self, queryset, serializer_class, transform=None):
+        """Paginated response for an extra action listing something other than the viewset's queryset."""
+        page = self.paginate_queryset(queryset)
+        if transform is not None:
+            page = [transform(item) for item in page]
+        serializer = serializer_class(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+
+class BulkActionMixin:
+    """
+    Adds `POST <prefix>/bulk/` taking `{"create": [ids], "delete": [ids]}` and
+    applying both lists in one transaction, with a result for every id.
+    """
+    bulk_create = None
+    bulk_delete = None
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        serializer = BulkActionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            created = self.bulk_create(request.user.id, serializer.validated_data['create'])
+            deleted = self.bulk_delete(request.user.id, serializer.validated_data['delete'])
+        return Response({
+            'create': [{'id': pk, 'result': result} for pk, result in created.items()],
+            'delete': [{'id': pk, 'result': result} for pk, result in deleted.items()],
+        })
+
+
+class PostViewset(PaginatedActionMixin, mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    authentication_classes = (TokenUserAuthentication, SessionAuthentication)
     queryset = Post.objects.all().order_by('-createdAt')
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = KeysetPagination
+    # The comments action filters by pk directly, so only route integer ids.
+    lookup_value_regex = '[0-9]+'
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -23,22 +69,90 @@ class PostViewset(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.Retriev
 
         return PostSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        names = [('post', self.kwargs['pk'])]
+        return caching.cached_response(request, 'post', names, super().retrieve, *args, **kwargs)
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        post = serializer.save()
+        caching.invalidate(('user', post.user_id))
+        outbox.publish('post.created', post=post.id, user=post.user_id)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        tags.untag_post(instance)
+        caching.invalidate(('post', instance.id), ('user', instance.user_id))
+        caching.invalidate_feeds(instance.feed_items.values_list('owner_id', flat=True))
+        # Only the request whose DELETE removed the row publishes, so concurrent deletes count once.
+        deleted, _ = Post.objects.filter(pk=instance.pk).delete()
+        if deleted:
+            outbox.publish('post.deleted', post=instance.pk, user=instance.user_id)
+
+    @action(detail=True)
+    def comments(self, request, pk=None):
+        comments = Comment.objects.filter(post=pk).select_related('user')
+        return self.paginated(comments, CommentsSerializer)
+
+    @action(detail=True, methods=['post'], parser_classes=(MultiPartParser,))
+    def upload(self, request, pk=None):
+        """Attach the multipart `files` to one of the user's posts, storing each distinct content once."""
+        post = self.get_object()
+        if post.user_id != request.user.id:
+            raise PermissionDenied()
+        files = request.FILES.getlist('files')
+        skipped = uploads.skipped_uploads(request._request)
+        if skipped:
+            raise ValidationError({'files': ['%s is larger than %d bytes.' % (name, uploads.MAX_SIZE) for name in skipped]})
+        if not files:
+            raise ValidationError({'files': 'No files uploaded.'})
+        if len(files) > uploads.MAX_FILES:
+            raise ValidationError({'files': 'At most %d files per upload.' % uploads.MAX_FILES})
+        rejected = [upload.name for upload in files if not uploads.is_media(upload)]
+        if rejected:
+            raise ValidationError({'files': ['%s is not a supported image or video.' % name for name in rejected]})
+        with transaction.atomic():
+            created = uploads.save_files(post, request.user.id, files)
+            caching.invalidate(('post', post.id))
+            caching.invalidate_feeds(post.feed_items.values_list('owner_id', flat=True))
+        return Response(FilesSerializer(created, many=True).data, status=status.HTTP_201_CREATED)
+
 
 class PostSearchViewset(mixins.ListModelMixin, viewsets.GenericViewSet):
-    authentication_classes = (JWTAuthentication, SessionAuthentication)
-    queryset = Post.objects.all().order_by('-createdAt')
+    authentication_classes = (TokenUserAuthentication, SessionAuthentication)
     serializer_class = PostPreviewSerializer
     permission_classes = (permissions.IsAuthenticated,)
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)
-    search_fields = ('caption', 'tags')
+    pagination_class = KeysetPagination
+
+    @property
+    def search_text(self):
+        return self.request.query_params.get('search', '').strip()
+
+    @property
+    def keyset_ordering(self):
+        if self.search_text:
+            return ('-rank', '-createdAt', '-id')
+        return KeysetPagination.ordering
+
+    def get_queryset(self):
+        if self.search_text:
+            return search.search_posts(self.search_text)
+        return Post.objects.all()
 
 
 class CommentViewset(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
-    authentication_classes = (JWTAuthentication, SessionAuthentication)
+    authentication_classes = (TokenUserAuthentication, SessionAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Comment.objects.all().order_by('-createdAt')
+        comments = Comment.objects.select_related('user').order_by('-createdAt')
+        post = self.request.query_params.get('post')
+        if post is not None:
+            if not post.isdigit():
+                raise ValidationError({'post': 'A valid integer is required.'})
+            comments = comments.filter(post=post)
+        return comments
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -46,11 +160,26 @@ class CommentViewset(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.
         
         return CommentsSerializer
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        comment = serializer.save()
+        outbox.publish('comment.created', comment=comment.id, post=comment.post_id, user=comment.user_id)
+        caching.invalidate(('post', comment.post_id), ('feed', self.request.user.id))
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        caching.invalidate(('post', instance.post_id), ('feed', self.request.user.id))
+        deleted, _ = Comment.objects.filter(pk=instance.pk).delete()
+        if deleted:
+            outbox.publish('comment.deleted', comment=instance.pk, post=instance.post_id, user=instance.user_id)
+
 
-class FollowViewset(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
-    authentication_classes = (JWTAuthentication, SessionAuthentication)
+class FollowViewset(BulkActionMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    authentication_classes = (TokenUserAuthentication, SessionAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
     lookup_field = 'following_id'
+    bulk_create = staticmethod(engagement.follow_users)
+    bulk_delete = staticmethod(engagement.unfollow_users)
     
     def get_queryset(self):
         return Follow.objects.filter(follower=self.request.user)
@@ -61,11 +190,56 @@ class FollowViewset(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.L
         
         return FollowSerializer
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        follow, created = Follow.objects.insert_or_get(**serializer.validated_data)
+        serializer.instance = follow
+        if created:
+            graph.followed(follow.follower_id, [follow.following_id])
+            caching.invalidate(('user', follow.follower_id), ('user', follow.following_id), ('feed', follow.follower_id))
+            outbox.publish('follow.created', pairs=[[follow.follower_id, follow.following_id]])
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        caching.invalidate(('user', instance.follower_id), ('user', instance.following_id), ('feed', instance.follower_id))
+        deleted, _ = Follow.objects.filter(pk=instance.pk).delete()
+        if deleted:
+            graph.unfollowed(instance.follower_id, [instance.following_id])
+            outbox.publish('follow.deleted', pairs=[[instance.follower_id, instance.following_id]])
+
+
+class WriteBehindMixin:
+    """
+    With ENGAGEMENT_WRITE_BEHIND, single creates and deletes are queued as
+    intents (see posts.writebehind) and answered without touching the
+    engagement table or the post counters.
+    """
+    write_behind_kind = None
 
-class LikeViewset(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
-    authentication_classes = (JWTAuthentication, SessionAuthentication )
+    def write_behind(self, serializer):
+        """Queue the create if write-behind is enabled; returns whether it was queued."""
+        if not writebehind.ENABLED:
+            return False
+        data = serializer.validated_data
+        writebehind.record(self.write_behind_kind, data['user'].id, data['post'].id, True)
+        return True
+
+    def destroy(self, request, *args, **kwargs):
+        if not writebehind.ENABLED:
+            return super().destroy(request, *args, **kwargs)
+        # The row may still be queued itself, so only the post has to exist.
+        post = get_object_or_404(Post.objects.only('id'), id=kwargs[self.lookup_field])
+        writebehind.record(self.write_behind_kind, request.user.id, post.id, False)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LikeViewset(WriteBehindMixin, BulkActionMixin, mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    authentication_classes = (TokenUserAuthentication, SessionAuthentication)
     permission_classes = (permissions.IsAuthenticated,) 
     lookup_field = 'post_id'
+    write_behind_kind = EngagementIntent.LIKE
+    bulk_create = staticmethod(engagement.like_posts)
+    bulk_delete = staticmethod(engagement.unlike_posts)
 
     def get_queryset(self):
         return Like.objects.filter(user=self.request.user)
@@ -76,11 +250,31 @@ class LikeViewset(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.Retriev
         
         return LikesSerializer
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        if self.write_behind(serializer):
+            return
+        like, created = Like.objects.insert_or_get(**serializer.validated_data)
+        serializer.instance = like
+        if created:
+            outbox.publish('like.created', pairs=[[like.user_id, like.post_id]])
+            caching.invalidate(('post', like.post_id), ('feed', like.user_id))
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        caching.invalidate(('post', instance.post_id), ('feed', instance.user_id))
+        deleted, _ = Like.objects.filter(pk=instance.pk).delete()
+        if deleted:
+            outbox.publish('like.deleted', pairs=[[instance.user_id, instance.post_id]])
 
-class SaveViewset(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
-    authentication_classes = (JWTAuthentication, SessionAuthentication )
+
+class SaveViewset(WriteBehindMixin, BulkActionMixin, mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    authentication_classes = (TokenUserAuthentication, SessionAuthentication)
     permission_classes = (permissions.IsAuthenticated,) 
     lookup_field = 'post_id'
+    write_behind_kind = EngagementIntent.SAVE
+    bulk_create = staticmethod(engagement.save_posts)
+    bulk_delete = staticmethod(engagement.unsave_posts)
 
     def get_queryset(self):
         return Save.objects.filter(user=self.request.user)
@@ -90,30 +284,156 @@ class SaveViewset(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.Retriev
             return SaveCreateSerializer
         
         return SavesSerializer
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        if self.write_behind(serializer):
+            return
+        save, created = Save.objects.insert_or_get(**serializer.validated_data)
+        serializer.instance = save
+        if created:
+            outbox.publish('save.created', pairs=[[save.user_id, save.post_id]])
+            caching.invalidate(('post', save.post_id), ('feed', save.user_id))
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        caching.invalidate(('post', instance.post_id), ('feed', instance.user_id))
+        deleted, _ = Save.objects.filter(pk=instance.pk).delete()
+        if deleted:
+            outbox.publish('save.deleted', pairs=[[instance.user_id, instance.post_id]])
  
 
-class FeedViewset(mixins.ListModelMixin, viewsets.GenericViewSet):
-    authentication_classes = (JWTAuthentication, SessionAuthentication )
+class FeedViewset(viewsets.GenericViewSet):
+    authentication_classes = (TokenUserAuthentication, SessionAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = KeysetPagination
     serializer_class = PostSerializer
 
-    def get_queryset(self):
-        follows = Follow.objects.filter(follower=self.request.user).values()
-        ids = []
-        for f in follows:
-            ids.append(f['following_id'])
-        ids.append(self.request.user.id)
+    def list(self, request, *args, **kwargs):
+        names = [('feed', request.user.id)]
+        return caching.cached_response(request, 'feed', names, self.feed_page, *args, **kwargs)
+
+    def feed_page(self, request, *args, **kwargs):
+        posts = self.paginator.paginate_fetch(functools.partial(feed.get_feed_page, request.user.id), request)
+        serializer = self.get_serializer(posts, many=True)
+        return self.get_paginated_response(serializer.data)
 
-        return Post.objects.filter(user__in=ids).order_by('-createdAt')
 
+class NotificationViewset(mixins.ListModelMixin, viewsets.GenericViewSet):
+    authentication_classes = (TokenUserAuthentication, SessionAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = KeysetPagination
+    serializer_class = NotificationSerializer
 
-class UserProfileViewset(mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
-    authentication_classes = (JWTAuthentication, SessionAuthentication)
+    def get_queryset(self):
+        return Notification.objects.filter(recipient=self.request.user).select_related('actor')
+
+
+class UserProfileViewset(PaginatedActionMixin, mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    authentication_classes = (TokenUserAuthentication, SessionAuthentication)
     permission_classes = (permissions.IsAuthenticated,) 
+    pagination_class = KeysetPagination
     queryset = User.objects.all()
+    # The list actions filter by pk directly, so only route integer ids.
+    lookup_value_regex = '[0-9]+'
+
+    @property
+    def keyset_ordering(self):
+        if self.action == 'list':
+            return ('-date_joined', '-id')
+        return KeysetPagination.ordering
 
     def get_serializer_class(self):
         if self.action == 'update':
             return UserSerializer
 
-        return UserProfileSerializer
\ No newline at end of file
+        return UserProfileSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        names = [('user', self.kwargs['pk'])]
+        return caching.cached_response(request, 'user', names, super().retrieve, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        user = serializer.save()
+        caching.invalidate(('user', user.id))
+
+    @action(detail=True)
+    def posts(self, request, pk=None):
+        return self.paginated(Post.objects.filter(user=pk), PostPreviewSerializer)
+
+    @action(detail=True)
+    def saved(self, request, pk=None):
+        # Paged in the order of saving, on Save's own (user, createdAt) index.
+        saves = Save.objects.filter(user=pk).select_related('post')
+        return self.paginated(saves, PostPreviewSerializer, lambda save: save.post)
+
+    @action(detail=True)
+    def followers(self, request, pk=None):
+        follows = Follow.objects.filter(following=pk).select_related('follower')
+        return self.paginated(follows, UserSerializer, lambda follow: follow.follower)
+
+    @action(detail=True)
+    def following(self, request, pk=None):
+        follows = Follow.objects.filter(follower=pk).select_related('following')
+        return self.paginated(follows, UserSerializer, lambda follow: follow.following)
+
+    @action(detail=False)
+    def suggestions(self, request):
+        serializer = SuggestionSerializer(suggestions.get_suggestions(request.user.id), many=True)
+        return Response(serializer.data)
+
+
+class TagViewset(PaginatedActionMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    authentication_classes = (TokenUserAuthentication, SessionAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = KeysetPagination
+    queryset = Tag.objects.all()
+    serializer_class = TagSerializer
+    lookup_field = 'name'
+    lookup_value_regex = '[^/]+'
+
+    def get_object(self):
+        # Tag names are stored lowercased (see tags.parse_tags).
+        self.kwargs[self.lookup_field] = self.kwargs[self.lookup_field].lower()
+        return super().get_object()
+
+    @action(detail=True)
+    def posts(self, request, name=None):
+        post_tags = PostTag.objects.filter(tag__name=name.lower()).select_related('post')
+        return self.paginated(post_tags, PostPreviewSerializer, lambda post_tag: post_tag.post)
+
+    @action(detail=False)
+    def trending(self, request):
+        serializer = TrendingTagSerializer(tags.trending(), many=True)
+        return Response(serializer.data)
+
+
+class CacheStatsViewset(viewsets.ViewSet):
+    authentication_classes = (TokenUserAuthentication, SessionAuthentication)
+    permission_classes = (permissions.IsAdminUser,)
+
+    def list(self, request):
+        return Response(caching.stats())
+
+
+class PerformanceViewset(viewsets.ViewSet):
+    authentication_classes = (TokenUserAuthentication, SessionAuthentication)
+    permission_classes = (permissions.IsAdminUser,)
+
+    def list(self, request):
+        """
+        Request timings per route from the worker process that answered, named
+        by host and pid; other workers keep their own. `since` is when this
+        process started collecting.
+        """
+        return Response(route_stats.summary())
+
+    @action(detail=False)
+    def pools(self, request):
+        """Connection pool statistics per database alias, when the pooled backend is in use."""
+        return Response({alias: pool.stats() for alias, pool in pools.items()})
+
+    @action(detail=False)
+    def outbox(self, request):
+        """Outbox events waiting for process_outbox, and those that ran out of attempts."""
+        return Response(outbox.stats())
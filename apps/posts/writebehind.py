@@ -0,0 +1,81 @@
+"""Write-behind likes and saves, queued as EngagementIntent rows and applied by flush_engagement."""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Like, Save, EngagementIntent
+from . import caching, outbox
+
+ENABLED = getattr(settings, 'ENGAGEMENT_WRITE_BEHIND', False)
+BATCH_SIZE = getattr(settings, 'ENGAGEMENT_FLUSH_BATCH_SIZE', 5000)
+
+MODELS = {EngagementIntent.LIKE: Like, EngagementIntent.SAVE: Save}
+
+
+def record(kind, user_id, post_id, added):
+    """Queue a like/save (`added`) or its removal for `user_id` on `post_id`."""
+    EngagementIntent.objects.create(kind=kind, user_id=user_id, post_id=post_id, added=added)
+    caching.invalidate(('post', post_id), ('feed', user_id))
+
+
+def pending(user_id, post_ids):
+    """The last queued state of each (kind, post id) for `user_id`, as True (added) or False (removed)."""
+    intents = EngagementIntent.objects.filter(user=user_id, post__in=post_ids).order_by('id')
+    return {(kind, post_id): added for kind, post_id, added in intents.values_list('kind', 'post_id', 'added')}
+
+
+def merge(stored, intents, kind):
+    """`stored` post ids with the pending intents of `kind` applied."""
+    merged = set(stored)
+    for (intent_kind, post_id), added in intents.items():
+        if intent_kind != kind:
+            continue
+        if added:
+            merged.add(post_id)
+        else:
+            merged.discard(post_id)
+    return merged
+
+
+def _apply(kind, states):
+    """Apply the final `states` {(user id, post id): added} of one kind; returns the pairs added and removed."""
+    model = MODELS[kind]
+    added = model.objects.insert_new(
+        [model(user_id=user_id, post_id=post_id) for (user_id, post_id), state in states.items() if state],
+        ('user', 'post'),
+    )
+    unwanted = {pair for pair, state in states.items() if not state}
+    rows = model.objects.filter(user__in={user_id for user_id, post_id in unwanted}, post__in={post_id for user_id, post_id in unwanted})
+    # Locked, so rows a concurrent request removes first are not counted here too.
+    locked = {(user_id, post_id): pk for pk, user_id, post_id in rows.select_for_update().values_list('id', 'user_id', 'post_id')}
+    removed = [pair for pair in locked if pair in unwanted]
+    model.objects.filter(id__in=[locked[pair] for pair in removed]).delete()
+    return added, removed
+
+
+def flush(batch_size=BATCH_SIZE):
+    """Apply up to `batch_size` of the oldest queued intents; returns how many were consumed."""
+    with transaction.atomic():
+        intents = list(
+            EngagementIntent.objects.select_for_update(skip_locked=True)
+            .order_by('id')
+            .values_list('id', 'kind', 'user_id', 'post_id', 'added')[:batch_size]
+        )
+        if not intents:
+            return 0
+
+        states = defaultdict(dict)
+        for intent_id, kind, user_id, post_id, added in intents:
+            states[kind][(user_id, post_id)] = added
+
+        for kind, kind_states in states.items():
+            added, removed = _apply(kind, kind_states)
+            # Counters, notifications and cache invalidation, as for the other write paths.
+            if added:
+                outbox.publish('%s.created' % kind, pairs=[list(pair) for pair in added])
+            if removed:
+                outbox.publish('%s.deleted' % kind, pairs=[list(pair) for pair in removed])
+
+        EngagementIntent.objects.filter(id__in=[intent[0] for intent in intents]).delete()
+    return len(intents)
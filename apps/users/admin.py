@@ -1,7 +1,9 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
 
 from .models import UserProfile
 
 # Register your models here.
 
-admin.site.register(UserProfile)
+# UserAdmin's forms hash the passwords they set.
+admin.site.register(UserProfile, UserAdmin)
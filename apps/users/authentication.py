@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+# Where TokenUserAuthentication gets request.user from:
+#   'cache'    - the user's CACHED_FIELDS, cached for JWT_USER_CACHE_TIMEOUT
+#                seconds and dropped whenever the user is saved or deleted
+#   'database' - the user row, loaded on every request
+#   'claims'   - built from the access token, no query (falls back to 'cache'
+#                for tokens issued before the claims were added). is_active,
+#                is_staff and is_superuser are only re-checked when a new
+#                token is issued, so only use it with a short
+#                ACCESS_TOKEN_LIFETIME.
+USER_SOURCE = getattr(settings, 'JWT_USER_SOURCE', 'cache')
+CACHE_TIMEOUT = getattr(settings, 'JWT_USER_CACHE_TIMEOUT', 300)
+
+CLAIM_FIELDS = ('is_staff', 'is_superuser')
+# What the 'cache' source keeps of a user; never the password hash or profile.
+CACHED_FIELDS = ('is_active', 'is_staff', 'is_superuser')
+
+
+def add_claims(token, user):
+    for field in CLAIM_FIELDS:
+        token[field] = getattr(user, field)
+    return token
+
+
+def user_cache_key(user_id):
+    return 'authuser:%s' % user_id
+
+
+def forget_user(user_id):
+    """Drop the cached fields of a user once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete(user_cache_key(user_id)))
+
+
+def partial_user(user_id, **fields):
+    """A User with only `user_id` and `fields` set, usable as a saved user in queries and foreign keys."""
+    user = User(**{api_settings.USER_ID_FIELD: user_id}, **fields)
+    user._state.adding = False
+    user._state.db = 'default'
+    return user
+
+
+class TokenUserAuthentication(JWTAuthentication):
+    """
+    JWT authentication that does not load the user row on every request.
+
+    With the 'cache' and 'claims' sources request.user is a partial User
+    carrying only the id and CACHED_FIELDS or CLAIM_FIELDS; it can be compared
+    with and assigned to foreign keys like a loaded user, but other fields
+    hold their defaults. With 'claims', deactivating a user, or revoking
+    staff rights, takes effect only when their access token expires.
+    """
+
+    def get_user(self, validated_token):
+        if USER_SOURCE == 'database':
+            return super().get_user(validated_token)
+        if USER_SOURCE == 'claims' and all(field in validated_token for field in CLAIM_FIELDS):
+            return self.user_from_claims(validated_token)
+        return self.cached_user(validated_token)
+
+    def user_from_claims(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise AuthenticationFailed('Token contained no recognizable user identification', code='no_user_id')
+        return partial_user(user_id, **{field: validated_token[field] for field in CLAIM_FIELDS})
+
+    def cached_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        key = user_cache_key(user_id)
+        fields = cache.get(key)
+        if fields is None:
+            user = super().get_user(validated_token)
+            fields = {field: getattr(user, field) for field in CACHED_FIELDS}
+            cache.set(key, fields, CACHE_TIMEOUT)
+        return partial_user(user_id, **fields)
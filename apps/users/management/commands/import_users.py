@@ -0,0 +1,77 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+import tablib
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from users.resources import UserResource
+
+User = get_user_model()
+
+
+def read_rows(path, fmt):
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Import users from a CSV or JSON Lines file, hashing passwords in parallel and inserting in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='password hashing processes')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError('cannot tell the format of %s, pass --format' % path)
+
+        resource = UserResource()
+        fields = set(UserResource.Meta.fields)
+        seen = set()
+        imported = skipped = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            for batch in batches(read_rows(path, fmt), options['batch_size']):
+                usernames = [row.get('username') for row in batch]
+                existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+                rows = []
+                for row in batch:
+                    username = row.get('username')
+                    if not username or username in existing or username in seen:
+                        skipped += 1
+                        continue
+                    seen.add(username)
+                    rows.append({field: value for field, value in row.items() if field in fields})
+                if not rows:
+                    continue
+
+                headers = sorted(set().union(*rows))
+                dataset = tablib.Dataset(*[[row.get(field, '') for field in headers] for row in rows], headers=headers)
+                result = resource.import_data(dataset, raise_errors=True, use_transactions=True, pool=pool)
+                imported += result.totals['new']
+                self.stdout.write('imported %d users' % imported)
+
+        self.stdout.write(self.style.SUCCESS('imported %d users, skipped %d existing or duplicate rows' % (imported, skipped)))
@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_auto_20210419_1050'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='followersCount',
+            field=models.IntegerField(default=0, verbose_name='followersCount'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='followingCount',
+            field=models.IntegerField(default=0, verbose_name='followingCount'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='postCount',
+            field=models.IntegerField(default=0, verbose_name='postCount'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='suggestionsStale',
+            field=models.BooleanField(db_index=True, default=True, verbose_name='suggestionsStale'),
+        ),
+    ]
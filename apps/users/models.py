@@ -11,6 +11,10 @@ class UserProfile(AbstractUser):
     avatar = models.CharField(max_length=100, default='', verbose_name='avatar')
     bio = models.CharField(max_length=200, null=True, blank=True, verbose_name='bio')
     website = models.CharField(max_length=50, null=True, blank=True, verbose_name='website')
+    postCount = models.IntegerField(default=0, verbose_name='postCount')
+    followersCount = models.IntegerField(default=0, verbose_name='followersCount')
+    followingCount = models.IntegerField(default=0, verbose_name='followingCount')
+    suggestionsStale = models.BooleanField(default=True, db_index=True, verbose_name='suggestionsStale')
 
     def __str__(self):
         return self.username
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from import_export import resources
+
+User = get_user_model()
+
+
+class UserResource(resources.ModelResource):
+    """
+    Imports new users in bulk. Rows are inserted with bulk_create, so the
+    password column is hashed here, optionally across a process pool passed
+    to import_data() as `pool`.
+    """
+
+    def before_import(self, dataset, **kwargs):
+        pool = kwargs.get('pool')
+        passwords = [password or None for password in dataset['password']] if 'password' in dataset.headers else [None] * len(dataset)
+        hashed = pool.map(make_password, passwords, chunksize=64) if pool is not None else map(make_password, passwords)
+        if 'password' in dataset.headers:
+            del dataset['password']
+        dataset.append_col(list(hashed), header='password')
+        if 'email' not in dataset.headers:
+            dataset.append_col(list(dataset['username']), header='email')
+
+    class Meta:
+        model = User
+        fields = ('username', 'email', 'password', 'nickname', 'first_name', 'last_name', 'avatar', 'bio', 'website')
+        import_id_fields = ('username',)
+        use_bulk = True
+        force_init_instance = True
+        skip_diff = True
@@ -3,10 +3,18 @@ from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+from instagram.performance import TimedSerializerMixin, TimedListSerializer
+from instagram.serializers import SparseFieldsMixin
+from .authentication import add_claims
+
 User = get_user_model()
 
 
 class JWTSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         data = super().validate(attrs)
 
@@ -25,11 +33,12 @@ class JWTSerializer(TokenObtainPairSerializer):
         return data
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = User
         fields = ("id", "nickname", "avatar", "bio", "first_name", "last_name", "website")
+        list_serializer_class = TimedListSerializer
 
 
 class UserSignupSerializer(serializers.ModelSerializer):
@@ -42,6 +51,10 @@ class UserSignupSerializer(serializers.ModelSerializer):
         attrs["email"] = attrs["username"]
         return attrs
 
+    def create(self, validated_data):
+        # Hashes the password before the single INSERT.
+        return User.objects.create_user(**validated_data)
+
     class Meta:
         model = User
         fields = ("password", "username", "nickname")
@@ -1,12 +1,13 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
+from .authentication import forget_user
+
 User = get_user_model()
 
 @receiver(post_save, sender=User)
-def create_user(sender, instance=None, created=False, **kwargs):
-    if created:
-        password = instance.password
-        instance.set_password(password)
-        instance.save()
\ No newline at end of file
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance=None, **kwargs):
+    """Make TokenUserAuthentication reload a user after any change, e.g. deactivation or revoked staff rights."""
+    forget_user(instance.id)
@@ -1,3 +1,164 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import authentication
+from .authentication import TokenUserAuthentication, add_claims, user_cache_key
+
+User = get_user_model()
 
 # Create your tests here.
+
+class SignupTests(TestCase):
+
+    def signup(self, password):
+        response = APIClient().post('/signup/', {'username': 'a@x.com', 'password': password, 'nickname': 'a'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('password', response.data)
+        return User.objects.get(username='a@x.com')
+
+    def test_password_is_hashed(self):
+        user = self.signup('secret')
+        self.assertNotEqual(user.password, 'secret')
+        self.assertTrue(user.check_password('secret'))
+        self.assertEqual(user.email, 'a@x.com')
+
+    def test_hash_shaped_password_is_hashed_too(self):
+        user = self.signup('md5$salt$abc')
+        self.assertNotEqual(user.password, 'md5$salt$abc')
+        self.assertTrue(user.check_password('md5$salt$abc'))
+
+    def test_signup_is_a_single_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.signup('secret')
+        writes = [query['sql'].split()[0] for query in queries if not query['sql'].startswith('SELECT')]
+        self.assertEqual(writes, ['INSERT'])
+
+    def test_login_after_signup(self):
+        self.signup('secret')
+        response = APIClient().post('/login/', {'username': 'a@x.com', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+
+
+class ImportUsersTests(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(username='old@x.com', password='pw', nickname='old')
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def import_users(self, path, *args):
+        out = StringIO()
+        call_command('import_users', path, '--workers', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv(self):
+        path = self.write('users.csv', 'username,password,nickname,bio\n'
+                                       'a@x.com,pw-a,a,hello\n'
+                                       'old@x.com,pw,old,\n'
+                                       'a@x.com,other,a2,\n'
+                                       'b@x.com,,b,\n')
+        output = self.import_users(path, '--batch-size', '2')
+        self.assertIn('imported 2 users, skipped 2', output)
+
+        a = User.objects.get(username='a@x.com')
+        self.assertTrue(a.check_password('pw-a'))
+        self.assertEqual((a.nickname, a.bio, a.email), ('a', 'hello', 'a@x.com'))
+        self.assertFalse(User.objects.get(username='b@x.com').has_usable_password())
+        self.assertTrue(User.objects.get(username='old@x.com').check_password('pw'))
+
+    def test_jsonl(self):
+        rows = [
+            {'username': 'a@x.com', 'password': 'pw-a', 'nickname': 'a', 'email': 'a@y.com', 'is_staff': True},
+            {'username': 'old@x.com', 'password': 'x', 'nickname': 'old'},
+            {'username': 'c@x.com', 'nickname': 'c'},
+        ]
+        path = self.write('users.jsonl', '\n'.join(json.dumps(row) for row in rows) + '\n\n')
+        self.assertIn('imported 2 users, skipped 1', self.import_users(path))
+
+        a = User.objects.get(username='a@x.com')
+        self.assertTrue(a.check_password('pw-a'))
+        self.assertEqual(a.email, 'a@y.com')
+        # Only UserResource's fields are imported.
+        self.assertFalse(a.is_staff)
+        self.assertFalse(User.objects.get(username='c@x.com').has_usable_password())
+
+    def test_hash_shaped_passwords_are_hashed(self):
+        path = self.write('users.jsonl', json.dumps({'username': 'a@x.com', 'password': 'md5$salt$abc', 'nickname': 'a'}))
+        self.import_users(path)
+        self.assertTrue(User.objects.get(username='a@x.com').check_password('md5$salt$abc'))
+
+    def test_format_from_option(self):
+        path = self.write('users.txt', 'username,nickname\na@x.com,a\n')
+        with self.assertRaises(CommandError):
+            self.import_users(path)
+        self.assertIn('imported 1 users', self.import_users(path, '--format', 'csv'))
+
+
+class TokenUserAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a@x.com', password='pw', nickname='a', is_staff=True)
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Bearer %s' % token)
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                user, validated = TokenUserAuthentication().authenticate(request)
+        return user, len(queries)
+
+    def test_cache_source_keeps_only_the_auth_fields(self):
+        token = AccessToken.for_user(self.user)
+        user, queries = self.authenticate(token)
+        self.assertEqual((user.id, user.is_staff, queries), (self.user.id, True, 1))
+        self.assertEqual(cache.get(user_cache_key(self.user.id)), {'is_active': True, 'is_staff': True, 'is_superuser': False})
+
+        user, queries = self.authenticate(token)
+        self.assertEqual((user.id, user.is_staff, user.password, queries), (self.user.id, True, '', 0))
+
+    def test_cache_source_sees_deactivation(self):
+        token = AccessToken.for_user(self.user)
+        self.authenticate(token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    @mock.patch.object(authentication, 'USER_SOURCE', 'claims')
+    def test_claims_source_runs_no_query(self):
+        user, queries = self.authenticate(add_claims(AccessToken.for_user(self.user), self.user))
+        self.assertEqual((user.id, user.is_staff, queries), (self.user.id, True, 0))
+        # Tokens issued without the claims fall back to the cache.
+        user, queries = self.authenticate(AccessToken.for_user(self.user))
+        self.assertEqual((user.id, queries), (self.user.id, 1))
+
+    @mock.patch.object(authentication, 'USER_SOURCE', 'database')
+    def test_database_source_loads_the_row(self):
+        token = AccessToken.for_user(self.user)
+        for n in range(2):
+            user, queries = self.authenticate(token)
+            self.assertEqual((user.nickname, queries), ('a', 1))
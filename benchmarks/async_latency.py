@@ -0,0 +1,62 @@
+"""
+Compares latency of the WSGI and async feed/profile endpoints under concurrent load.
+
+Start the app under an ASGI server (e.g. `uvicorn instagram.asgi:application
+--workers 1`) so both paths are served by the same process, then run:
+
+    python benchmarks/async_latency.py --base-url http://localhost:8000 --token <access token> --user 1
+
+Each route gets --requests GETs from --concurrency threads; the script prints
+requests per second and p50/p95/p99 latency per route.
+"""
+import argparse
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(ordered, p):
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def fetch(url, token):
+    request = urllib.request.Request(url, headers={'Authorization': 'Bearer %s' % token})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+
+def run(url, token, concurrency, requests):
+    fetch(url, token)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = sorted(pool.map(lambda _: fetch(url, token), range(requests)))
+    elapsed = time.perf_counter() - start
+    return requests / elapsed, percentile(timings, 50), percentile(timings, 95), percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--token', required=True, help='JWT access token from /login/')
+    parser.add_argument('--user', type=int, required=True, help='Profile to request')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    base = args.base_url.rstrip('/')
+    routes = [
+        ('feed (wsgi)', '%s/feed/' % base),
+        ('feed (async)', '%s/async/feed/' % base),
+        ('profile (wsgi)', '%s/users/%d/' % (base, args.user)),
+        ('profile (async)', '%s/async/users/%d/' % (base, args.user)),
+    ]
+    print('%-18s %8s %8s %8s %8s' % ('route', 'req/s', 'p50', 'p95', 'p99'))
+    for name, url in routes:
+        print('%-18s %8.1f %8.1f %8.1f %8.1f' % ((name,) + run(url, args.token, args.concurrency, args.requests)))
+
+
+if __name__ == '__main__':
+    main()
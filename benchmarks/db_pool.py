@@ -0,0 +1,77 @@
+"""
+Compares request throughput against PostgreSQL with and without the connection pool.
+
+    python benchmarks/db_pool.py --name ins-backend --user dbuser --password 123456 --threads 16 --requests 2000
+
+Each simulated request does what Django does per request: open the
+connection, run a representative indexed query, and close the connection
+at the end. The pooled backend turns the open and close into a checkout
+and a return.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+QUERY = 'SELECT id FROM posts_post ORDER BY "createdAt" DESC LIMIT 20'
+
+
+def percentile(ordered, p):
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def request(alias):
+    from django.db import connections
+    connection = connections[alias]
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute(QUERY)
+        cursor.fetchall()
+    connection.close()
+    return (time.perf_counter() - start) * 1000
+
+
+def run(alias, threads, requests):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(request, [alias] * threads))
+        start = time.perf_counter()
+        timings = sorted(pool.map(request, [alias] * requests))
+    elapsed = time.perf_counter() - start
+    return requests / elapsed, percentile(timings, 50), percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--name', default='ins-backend')
+    parser.add_argument('--user', default='dbuser')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--pool-size', type=int, default=16)
+    args = parser.parse_args()
+
+    database = {'NAME': args.name, 'USER': args.user, 'PASSWORD': args.password, 'HOST': args.host}
+    settings.configure(DATABASES={
+        'default': dict(database, ENGINE='django.db.backends.postgresql'),
+        'pooled': dict(database, ENGINE='instagram.backends.postgresql_pool', POOL={'SIZE': args.pool_size}),
+    })
+    django.setup()
+    from instagram.backends.postgresql_pool.pool import pools
+
+    print('%-8s %8s %8s %8s' % ('backend', 'req/s', 'p50', 'p99'))
+    for name, alias in (('direct', 'default'), ('pooled', 'pooled')):
+        print('%-8s %8.1f %8.2f %8.2f' % ((name,) + run(alias, args.threads, args.requests)))
+    print('pool: %s' % pools['pooled'].stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares encode time and payload size of the response renderers on feed and profile shaped data.
+
+    python benchmarks/renderers.py --posts 20 --rounds 500
+
+The payloads mirror PostSerializer and UserProfileSerializer output: a feed
+page of posts with user, files and comment previews, and a profile header.
+"""
+import argparse
+import os
+import sys
+import time
+import timeit
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'instagram.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from instagram.renderers import ORJSONRenderer, MessagePackRenderer  # noqa: E402
+
+
+def user(user_id):
+    return {
+        'id': user_id, 'nickname': 'user%d' % user_id, 'avatar': 'https://cdn.example.com/avatars/%d.jpg' % user_id,
+        'bio': 'Photographer, traveller and coffee drinker', 'first_name': 'First', 'last_name': 'Last',
+        'website': 'https://example.com/%d' % user_id,
+    }
+
+
+def post(post_id, comments):
+    created = time.strftime('%Y-%m-%dT%H:%M:%S.123456')
+    return {
+        'id': post_id, 'user': user(post_id % 50), 'caption': 'A caption with a few #tags and some words #%d' % post_id,
+        'tags': 'travel,food', 'createdAt': created, 'likesCount': 1234, 'commentsCount': 56, 'savesCount': 7,
+        'files': [{'id': post_id * 10 + n, 'url': 'https://cdn.example.com/p/%d/%d.jpg' % (post_id, n), 'createdAt': created, 'post': post_id, 'user': post_id % 50} for n in range(3)],
+        'isLiked': post_id % 2 == 0, 'isSaved': False,
+        'comments': [{'id': post_id * 100 + n, 'user': user(n), 'text': 'Nice shot! 😍', 'createdAt': created, 'post': post_id} for n in range(comments)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--posts', type=int, default=20, help='posts per feed page')
+    parser.add_argument('--comments', type=int, default=3, help='comment previews per post')
+    parser.add_argument('--rounds', type=int, default=500)
+    args = parser.parse_args()
+
+    payloads = {
+        'feed': {'next': 'WyIyMDI2LTEwLTE4VDE4OjI1OjQ0IiwgNF0=', 'results': [post(n, args.comments) for n in range(args.posts)]},
+        'profile': dict(user(1), isMe=False, isFollowing=True, postCount=321, followersCount=4567, followingCount=89),
+    }
+    renderers = [('drf json', JSONRenderer()), ('orjson', ORJSONRenderer()), ('msgpack', MessagePackRenderer())]
+
+    print('%-8s %-9s %10s %10s' % ('payload', 'renderer', 'us/render', 'bytes'))
+    for name, data in payloads.items():
+        for renderer_name, renderer in renderers:
+            seconds = timeit.timeit(lambda: renderer.render(data), number=args.rounds)
+            print('%-8s %-9s %10.1f %10d' % (name, renderer_name, seconds / args.rounds * 1e6, len(renderer.render(data))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""
+PostgreSQL backend that reuses connections from a per-process pool.
+Configure it with a POOL entry in the database settings and keep CONN_MAX_AGE at 0.
+"""
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+
+from instagram.performance import record_pool_wait
+from .pool import get_pool
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        connection, waited = self.pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        record_pool_wait(waited)
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
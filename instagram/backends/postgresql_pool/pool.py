@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class ConnectionPool:
+    """
+    A bounded pool of psycopg2 connections shared by the threads of a process.
+
+    At most `size` connections are checked out at once; further checkouts
+    wait up to `timeout` seconds. Idle connections older than `max_lifetime`
+    are closed instead of reused and, with `pre_ping`, an idle connection is
+    checked with a trivial query before it is handed out.
+    """
+
+    def __init__(self, size=10, max_lifetime=1800, timeout=10, pre_ping=True):
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = deque()
+        self.created_at = {}
+        self.checkouts = 0
+        self.connects = 0
+        self.discarded = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def acquire(self, connect):
+        """A connection from the pool, or a new one made by `connect()`. Returns it with the seconds spent waiting."""
+        start = time.perf_counter()
+        if not self.slots.acquire(timeout=self.timeout):
+            with self.lock:
+                self.timeouts += 1
+            raise psycopg2.OperationalError('connection pool exhausted: no connection free after %ss' % self.timeout)
+        waited = time.perf_counter() - start
+        with self.lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        try:
+            return self._checkout(connect), waited
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def _checkout(self, connect):
+        while True:
+            with self.lock:
+                connection = self.idle.pop() if self.idle else None
+            if connection is None:
+                connection = connect()
+                with self.lock:
+                    self.connects += 1
+                    self.created_at[connection] = time.monotonic()
+                return connection
+            if not self.expired(connection) and (not self.pre_ping or self.ping(connection)):
+                return connection
+            self.discard(connection)
+
+    def release(self, connection):
+        """Return a checked out connection, rolling back anything left open; broken or expired ones are closed."""
+        try:
+            if connection.closed or self.expired(connection):
+                self.discard(connection)
+                return
+            if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except psycopg2.Error:
+                    self.discard(connection)
+                    return
+            with self.lock:
+                self.idle.append(connection)
+        finally:
+            self.slots.release()
+
+    def expired(self, connection):
+        return time.monotonic() - self.created_at.get(connection, 0) > self.max_lifetime
+
+    def ping(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def discard(self, connection):
+        with self.lock:
+            self.discarded += 1
+            self.created_at.pop(connection, None)
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'open': len(self.created_at),
+                'idle': len(self.idle),
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'discarded': self.discarded,
+                'timeouts': self.timeouts,
+                'waitAvgMs': round(self.wait_total / self.checkouts * 1000, 2) if self.checkouts else 0,
+                'waitMaxMs': round(self.wait_max * 1000, 2),
+            }
+
+
+pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    """The pool of a database alias, created from its POOL settings on first use."""
+    with _pools_lock:
+        if alias not in pools:
+            options = settings_dict.get('POOL', {})
+            pools[alias] = ConnectionPool(
+                size=options.get('SIZE', 10),
+                max_lifetime=options.get('MAX_LIFETIME', 1800),
+                timeout=options.get('TIMEOUT', 10),
+                pre_ping=options.get('PRE_PING', True),
+            )
+        return pools[alias]
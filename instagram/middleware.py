@@ -0,0 +1,92 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from .performance import start_request, end_request, timed_queries, route_stats
+from .db import REPLICAS, PIN_SECONDS, replica_reads
+
+logger = logging.getLogger('instagram.performance')
+
+SLOW_REQUEST_MS = getattr(settings, 'SLOW_REQUEST_MS', 500)
+
+
+class ServerTimingMiddleware:
+    """
+    Measures wall time, database queries and serializer time of each request,
+    reports them in a Server-Timing header, records them per route and logs
+    requests slower than SLOW_REQUEST_MS with their most repeated queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics, token = start_request()
+        try:
+            with timed_queries():
+                response = self.get_response(request)
+        finally:
+            end_request(token)
+
+        total = metrics.total_time * 1000
+        timings = [
+            'db;dur=%.1f;desc="%d queries"' % (metrics.db_time * 1000, metrics.queries),
+            'serialize;dur=%.1f' % (metrics.serialize_time * 1000),
+            'total;dur=%.1f' % total,
+        ]
+        if metrics.pool_wait:
+            timings.insert(1, 'pool;dur=%.1f' % (metrics.pool_wait * 1000))
+        response['Server-Timing'] = ', '.join(timings)
+
+        route = self.route_of(request)
+        if route is not None:
+            route_stats.add(route, metrics)
+        if total >= SLOW_REQUEST_MS:
+            logger.warning(
+                'slow request %s %s: %.1fms, %d queries (%.1fms), serialize %.1fms\n%s',
+                request.method, request.path, total, metrics.queries, metrics.db_time * 1000,
+                metrics.serialize_time * 1000,
+                '\n'.join('  %dx %s' % (count, sql) for sql, count in metrics.fingerprints.most_common(5)),
+            )
+        return response
+
+    def route_of(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return None
+        return '%s %s' % (request.method, match.view_name or match.route)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe-method requests read from replicas, except for clients that
+    wrote within the last REPLICA_PIN_SECONDS. Clients are told apart by
+    their credentials (Authorization header or session cookie), falling
+    back to their address.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not REPLICAS:
+            return self.get_response(request)
+
+        key = self.pin_key(request)
+        safe = request.method in SAFE_METHODS
+        with replica_reads(safe and not cache.get(key)):
+            response = self.get_response(request)
+        if not safe:
+            cache.set(key, True, PIN_SECONDS)
+        return response
+
+    def pin_key(self, request):
+        client = (
+            request.META.get('HTTP_AUTHORIZATION')
+            or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+            or request.META.get('REMOTE_ADDR', '')
+        )
+        return 'pin:%s' % hashlib.md5(client.encode('utf-8')).hexdigest()
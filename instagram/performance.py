@@ -0,0 +1,160 @@
+"""Per-request performance measurements, reported by ServerTimingMiddleware."""
+import os
+import re
+import socket
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+# Number of recent requests kept per route for percentiles.
+ROUTE_SAMPLES = getattr(settings, 'PERFORMANCE_ROUTE_SAMPLES', 1000)
+
+_current = ContextVar('request_metrics', default=None)
+
+_NUMBER_RE = re.compile(r'\b\d+(\.\d+)?\b')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST_RE = re.compile(r'\((\s*(%s|\?)\s*,)+\s*(%s|\?)\s*\)')
+
+
+def fingerprint(sql):
+    """The shape of a query with literals and IN lists collapsed, so repeated queries group together."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('(...)', sql)
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.pool_wait = 0.0
+        self.fingerprints = Counter()
+        self._serializing = False
+        # Queries of one request may run on several threads (see posts.async_views).
+        self.lock = threading.Lock()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.db_time += elapsed
+                self.queries += 1
+                self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed_queries():
+    """Count the queries run on this thread's connections towards the current request, if there is one."""
+    metrics = _current.get()
+    with ExitStack() as stack:
+        if metrics is not None:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(metrics.execute_wrapper))
+        yield
+
+
+def record_pool_wait(seconds):
+    """Add time spent waiting for a pooled database connection to the current request."""
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics.lock:
+            metrics.pool_wait += seconds
+
+
+class TimedSerializerMixin:
+    """Adds the time spent building `.data` to the current request's serializer time."""
+
+    @property
+    def data(self):
+        metrics = _current.get()
+        if metrics is None or metrics._serializing:
+            return super().data
+        metrics._serializing = True
+        start = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            metrics.serialize_time += time.perf_counter() - start
+            metrics._serializing = False
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class RouteStats:
+    """
+    Recent request timings per route, kept in the memory of this process.
+    Each worker only sees the requests it served, so summaries say which
+    process they come from.
+    """
+
+    def __init__(self, samples=ROUTE_SAMPLES):
+        self.samples = samples
+        self.lock = threading.Lock()
+        self.routes = defaultdict(lambda: deque(maxlen=self.samples))
+        self.since = time.time()
+
+    def add(self, route, metrics):
+        sample = (metrics.total_time * 1000, metrics.db_time * 1000, metrics.serialize_time * 1000, metrics.queries)
+        with self.lock:
+            self.routes[route].append(sample)
+
+    def summary(self):
+        with self.lock:
+            routes = {route: list(samples) for route, samples in self.routes.items()}
+            since = self.since
+        result = {}
+        for route, samples in sorted(routes.items()):
+            totals = sorted(sample[0] for sample in samples)
+            queries = [sample[3] for sample in samples]
+            result[route] = {
+                'count': len(samples),
+                'p50': round(percentile(totals, 50), 1),
+                'p90': round(percentile(totals, 90), 1),
+                'p99': round(percentile(totals, 99), 1),
+                'dbAvg': round(sum(sample[1] for sample in samples) / len(samples), 1),
+                'serializeAvg': round(sum(sample[2] for sample in samples) / len(samples), 1),
+                'queriesAvg': round(sum(queries) / len(queries), 1),
+                'queriesMax': max(queries),
+            }
+        # The pid is read here rather than at import, which may happen in a pre-fork master.
+        return {'host': socket.gethostname(), 'pid': os.getpid(), 'since': since, 'routes': result}
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+            self.since = time.time()
+
+
+def percentile(ordered, p):
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+route_stats = RouteStats()
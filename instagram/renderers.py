@@ -0,0 +1,33 @@
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Converts what orjson and msgpack can't encode natively (datetimes, Decimal,
+# lazy strings, querysets, ...) the same way DRF's JSONRenderer does.
+_default = JSONEncoder().default
+
+
+class ORJSONRenderer(BaseRenderer):
+    """Compact UTF-8 JSON rendered with orjson, matching DRF's JSONRenderer output for API data."""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack for clients sending `Accept: application/msgpack`."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True)
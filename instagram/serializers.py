@@ -0,0 +1,33 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def requested_names(request, param):
+    value = request.query_params.get(param) if request is not None else None
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Lets GET requests choose the fields of the response with `?fields=a,b`
+    and/or `?exclude=c`. Fields are removed before serialization, so method
+    fields that were not asked for are never evaluated.
+
+    Only the top-level serializer (or the child of a top-level list) is
+    pruned; nested serializers keep all their fields.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not self.is_top_level():
+            return fields
+        only = requested_names(request, 'fields')
+        exclude = requested_names(request, 'exclude') or set()
+        return {name: field for name, field in fields.items() if (only is None or name in only) and name not in exclude}
+
+    def is_top_level(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'instagram.middleware.ServerTimingMiddleware',
+    'instagram.middleware.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -89,6 +91,24 @@ DATABASES = {
         'HOST': '127.0.0.1'
     }
 }
+# Set DB_POOL_SIZE to reuse connections from a per-process pool.
+if os.environ.get('DB_POOL_SIZE'):
+    DATABASES['default'].update({
+        'ENGINE': 'instagram.backends.postgresql_pool',
+        'POOL': {
+            'SIZE': int(os.environ['DB_POOL_SIZE']),
+            'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+            'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'PRE_PING': True,
+        },
+    })
+# Read replicas of the default database, as comma separated hosts.
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES['replica%d' % index] = dict(DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'})
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['instagram.db.ReplicaRouter']
+# Seconds a client reads from the primary after writing.
+REPLICA_PIN_SECONDS = 5
 
 
 # Password validation
@@ -129,6 +149,12 @@ USE_TZ = False
 
 STATIC_URL = '/static/'
 
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_URL = '/media/'
+# Uploads are hashed while they stream to a temporary file (see posts.uploads).
+FILE_UPLOAD_HANDLERS = ['posts.uploads.HashingFileUploadHandler']
+MEDIA_UPLOAD_MAX_SIZE = 50 * 1024 * 1024
+
 DEFAULT_AUTO_FIELD='django.db.models.AutoField'
 
 REST_FRAMEWORK = {
@@ -144,6 +170,11 @@ REST_FRAMEWORK = {
     #     'anon': '100/day',
     #     'user': '1000/day'
     # },
+    'DEFAULT_RENDERER_CLASSES': (
+        'instagram.renderers.ORJSONRenderer',
+        'instagram.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema'
 }
 
@@ -157,3 +188,44 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_LIFETIME': timedelta(days=7),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=7),
 }
+# 'claims' skips the user query but trusts is_active/is_staff in the token until
+# it expires; only use it with a short ACCESS_TOKEN_LIFETIME.
+JWT_USER_SOURCE = 'cache'
+JWT_USER_CACHE_TIMEOUT = 300
+
+#Feed
+FEED_FANOUT_LIMIT = 5000
+FEED_BACKFILL_SIZE = 50
+FEED_MAX_ITEMS = 1000
+FOLLOW_GRAPH_SYNC_INTERVAL = 1
+FOLLOW_GRAPH_RELOAD_INTERVAL = 30
+SUGGESTIONS_LIMIT = 50
+COMMENT_PREVIEW_SIZE = 3
+ENGAGEMENT_WRITE_BEHIND = False
+ENGAGEMENT_FLUSH_BATCH_SIZE = 5000
+OUTBOX_ENABLED = False
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 10
+
+#Pagination
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+BULK_MAX_ITEMS = 500
+
+#Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+RESPONSE_CACHE_TIMEOUT = 60
+
+#Performance
+SLOW_REQUEST_MS = 500
+PERFORMANCE_ROUTE_SAMPLES = 1000
+ASYNC_DB_WORKERS = 8
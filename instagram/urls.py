@@ -13,6 +13,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
 from django.conf.urls import url, include
@@ -20,7 +22,8 @@ from rest_framework.documentation import include_docs_urls
 from rest_framework.routers import DefaultRouter
 
 from users.views import LoginViewset, SignupViewSet
-from posts.views import UserProfileViewset, FeedViewset, LikeViewset, FollowViewset, CommentViewset, PostViewset, SaveViewset, PostSearchViewset
+from posts import async_views
+from posts.views import UserProfileViewset, FeedViewset, LikeViewset, FollowViewset, CommentViewset, PostViewset, SaveViewset, PostSearchViewset, TagViewset, CacheStatsViewset, PerformanceViewset, NotificationViewset
 
 router = DefaultRouter()
 
@@ -33,6 +36,10 @@ router.register(r'follow', FollowViewset, basename = 'follow')
 router.register(r'comment', CommentViewset, basename = 'comment')
 router.register(r'save', SaveViewset, basename = 'save')
 router.register(r'postsearch', PostSearchViewset, basename = 'postsearch')
+router.register(r'tags', TagViewset, basename = 'tags')
+router.register(r'notifications', NotificationViewset, basename = 'notifications')
+router.register(r'cachestats', CacheStatsViewset, basename = 'cachestats')
+router.register(r'performance', PerformanceViewset, basename = 'performance')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -40,4 +47,6 @@ urlpatterns = [
     url(r'^', include(router.urls)),
     url(r'docs/', include_docs_urls(title="Picture Sharing App")),
     path('login/', LoginViewset.as_view(), name='token_obtain_pair'),
-]
+    path('async/feed/', async_views.feed_list, name='async-feed'),
+    path('async/users/<int:pk>/', async_views.user_profile, name='async-users-detail'),
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)